@@ -0,0 +1,120 @@
+"""
+Embedding backend benchmark.
+
+Compares the PyTorch SentenceTransformer backend (HuggingFaceEmbedding) with ONNX
+Runtime in float32 and int8 (OnnxEmbedding) on CPU. Reports single query latency
+(p50/p99) and document throughput per batch size, plus the cosine similarity of each
+backend's embeddings to the PyTorch ones as a sanity check on quantisation.
+
+Requires: pip install 'dria_agent[huggingface, onnx]'
+
+Run with:
+    python benchmarks/embedding_backends.py
+    python benchmarks/embedding_backends.py --model Snowflake/snowflake-arctic-embed-xs --dim 384 --threads 4
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from dria_agent.agent.embedder import HuggingFaceEmbedding, OnnxEmbedding
+
+WORDS = (
+    "list docker containers send slack message solve quadratic equation fetch "
+    "github pull request merge branch search web results calendar event email "
+    "create delete update file directory repository issue comment summary"
+).split()
+
+
+def corpus(n: int, seed: int = 0):
+    """Tool-description-like sentences of varying length."""
+    rng = np.random.default_rng(seed)
+    return [
+        " ".join(rng.choice(WORDS, rng.integers(6, 60)).tolist()) for _ in range(n)
+    ]
+
+
+def backends(args):
+    common = dict(dim=args.dim, model_name=args.model, query_cache_size=0)
+    onnx = dict(intra_op_threads=args.threads, warm_up=True, **common)
+    return {
+        "torch": lambda: HuggingFaceEmbedding(warm_up=True, **common),
+        "onnx-fp32": lambda: OnnxEmbedding(quantize=False, **onnx),
+        "onnx-int8": lambda: OnnxEmbedding(quantize=True, **onnx),
+    }
+
+
+def query_latency(embedding, queries):
+    for q in queries[:5]:
+        embedding.embed_query(q)
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        embedding.embed_query(q)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def throughput(embedding, docs, batch_size):
+    embedding.batch_embed(docs[:batch_size])
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch_size):
+        embedding.batch_embed(docs[i : i + batch_size])
+    return len(docs) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend benchmark.")
+    parser.add_argument("--model", default="Snowflake/snowflake-arctic-embed-m")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX intra-op threads")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--docs", type=int, default=512)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument(
+        "--backends", nargs="+", default=["torch", "onnx-fp32", "onnx-int8"]
+    )
+    args = parser.parse_args()
+
+    queries = corpus(args.queries, seed=1)
+    docs = corpus(args.docs, seed=2)
+    probe = docs[:64]
+    reference = None
+    results = []
+    for name, build in backends(args).items():
+        if name not in args.backends:
+            continue
+        embedding = build()
+        vectors = np.asarray(embedding.batch_embed(probe), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        if reference is None:
+            reference = vectors
+        p50, p99 = query_latency(embedding, queries)
+        result = {
+            "backend": name,
+            "query_p50_ms": p50,
+            "query_p99_ms": p99,
+            "cosine_to_first": float(np.mean(np.sum(vectors * reference, axis=1))),
+            "docs_per_s": {
+                bs: throughput(embedding, docs, bs) for bs in args.batch_sizes
+            },
+        }
+        results.append(result)
+        print(json.dumps(result), file=sys.stderr)
+
+    print(f"{'backend':<10} {'p50 ms':>8} {'p99 ms':>8} {'cos':>6} " + " ".join(
+        f"{'bs=' + str(bs) + ' doc/s':>14}" for bs in args.batch_sizes
+    ))
+    for r in results:
+        print(
+            f"{r['backend']:<10} {r['query_p50_ms']:8.2f} {r['query_p99_ms']:8.2f} "
+            f"{r['cosine_to_first']:6.3f} "
+            + " ".join(f"{r['docs_per_s'][bs]:14.1f}" for bs in args.batch_sizes)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Tool retrieval benchmark and regression suite.
+
+Builds synthetic catalogs from the tool library, scaled up with paraphrased
+variants of every tool scoped to a named workspace, and evaluates ToolDB
+configurations on labelled query -> tool pairs. Embeddings come from a
+deterministic hashing embedder, so runs are offline and reproducible.
+
+Reports recall@1, recall@k, MRR@k, p50/p99 latency per query and memory per
+index size as JSON. Pass --baseline to compare against a previous run and
+exit with status 1 on regressions.
+
+Requires the tool library extras: pip install 'dria_agent[tools]'
+
+Run with:
+    python benchmarks/retrieval.py --sizes 1000 10000 --output results.json
+    python benchmarks/retrieval.py --baseline results.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import zlib
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.lexical import BM25Index, tokenize
+from dria_agent.agent.vdb import ToolDB, IVFIndex
+from dria_agent.tools import (
+    MATH_TOOLS,
+    DOCKER_TOOLS,
+    GITHUB_TOOLS,
+    API_TOOLS,
+    SEARCH_TOOLS,
+    SLACK_TOOLS,
+    APPLE_TOOLS,
+)
+
+LIBRARIES = [
+    MATH_TOOLS,
+    DOCKER_TOOLS,
+    GITHUB_TOOLS,
+    API_TOOLS,
+    SEARCH_TOOLS,
+    SLACK_TOOLS,
+    APPLE_TOOLS,
+]
+
+EXACT = {"ann_threshold": sys.maxsize}
+CONFIGS = {
+    "exact": lambda dim: dict(EXACT),
+    "ivf": lambda dim: {"index": IVFIndex()},
+    "int8": lambda dim: {"storage": "int8", **EXACT},
+    "pq": lambda dim: {"storage": "pq", **EXACT},
+    "hybrid": lambda dim: {"lexical": BM25Index(), **EXACT},
+    "mrl": lambda dim: {"dim": dim // 2, **EXACT},
+    "mrl-rescore": lambda dim: {"dim": dim // 2, "rescore": 50, **EXACT},
+}
+
+SYNONYMS = {
+    "list": ["show", "enumerate", "display"],
+    "get": ["fetch", "retrieve", "look up"],
+    "fetch": ["get", "retrieve", "pull"],
+    "create": ["make", "set up", "add"],
+    "delete": ["remove", "drop", "erase"],
+    "remove": ["delete", "drop", "get rid of"],
+    "send": ["post", "deliver", "dispatch"],
+    "search": ["look up", "find", "query"],
+    "compute": ["calculate", "work out", "determine"],
+    "calculate": ["compute", "work out", "figure out"],
+    "start": ["launch", "run", "boot"],
+    "stop": ["halt", "shut down", "terminate"],
+    "performs": ["runs", "does", "executes"],
+    "message": ["note", "text", "msg"],
+    "file": ["document", "attachment"],
+    "repositories": ["repos", "projects"],
+    "containers": ["docker instances", "running containers"],
+    "image": ["picture", "docker image"],
+    "event": ["meeting", "appointment"],
+    "summary": ["overview", "synopsis"],
+}
+
+TEMPLATES = [
+    "{}",
+    "please {}",
+    "can you {}?",
+    "i need to {}",
+    "{} for me",
+    "help me {}",
+]
+
+SYLLABLES = ["ba", "ko", "di", "ru", "ze", "ma", "ti", "no", "lu", "fe", "xa", "po"]
+
+
+class HashingEmbedding(BaseEmbedding):
+    """Deterministic bag-of-words embedding: tokens are hashed into signed buckets."""
+
+    def __init__(self, dim: int = 256):
+        super().__init__("hashing", dim, query_cache_size=0)
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(str(text)):
+            h = zlib.crc32(token.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector
+
+    def batch_embed(self, texts):
+        return np.stack([self._vector(t) for t in texts])
+
+    def _embed_query(self, text):
+        return self._vector(text)
+
+
+class SyntheticTool:
+    """Stands in for a ToolCall: a name and a rendered schema."""
+
+    def __init__(self, name: str, schema: str):
+        self.name = name
+        self.schema = schema
+
+    def __str__(self):
+        return self.schema
+
+
+def entity(i: int) -> str:
+    """Deterministic pronounceable workspace name for index i."""
+    name = ""
+    i += len(SYLLABLES)
+    while i:
+        i, r = divmod(i, len(SYLLABLES))
+        name += SYLLABLES[r]
+    return name
+
+
+def summary(tool) -> str:
+    """First docstring line as a lowercase imperative phrase."""
+    lines = [l.strip() for l in tool.docstring.strip().splitlines() if l.strip()]
+    words = (lines[0] if lines else tool.name.replace("_", " ")).rstrip(".").split()
+    first = words[0].lower()
+    if first.endswith("es") and first[:-2].endswith(("ch", "sh", "ss", "x")):
+        first = first[:-2]
+    elif first.endswith("s") and not first.endswith("ss"):
+        first = first[:-1]
+    return " ".join([first] + [w.lower() for w in words[1:]])
+
+
+def paraphrase(text: str, rng: np.random.Generator) -> str:
+    words = []
+    for word in text.split():
+        options = SYNONYMS.get(word)
+        words.append(options[rng.integers(len(options))] if options else word)
+    return " ".join(words)
+
+
+def build_catalog(size: int, seed: int = 0) -> Tuple[List[SyntheticTool], Dict]:
+    """
+    :return: (tools, {tool name: (base tool, workspace)})
+    """
+    base = [t for library in LIBRARIES for t in library]
+    rng = np.random.default_rng(seed)
+    tools, labels = [], {}
+    for i in range(size):
+        tool, workspace = base[i % len(base)], entity(i // len(base))
+        name = f"{tool.name}_{workspace}"
+        lines = str(tool).splitlines()
+        lines[0] = lines[0].replace(f"def {tool.name}(", f"def {name}(", 1)
+        lines[2] = (
+            f"    {paraphrase(summary(tool), rng).capitalize()}. "
+            f"Operates on the {workspace} workspace."
+        )
+        tools.append(SyntheticTool(name, "\n".join(lines)))
+        labels[name] = (tool, workspace)
+    return tools, labels
+
+
+def build_queries(labels: Dict, n: int, seed: int = 1) -> List[Tuple[str, str]]:
+    """:return: n labelled (query, tool name) pairs."""
+    rng = np.random.default_rng(seed)
+    names = list(labels)
+    pairs = []
+    for i in rng.choice(len(names), min(n, len(names)), replace=False):
+        tool, workspace = labels[names[i]]
+        text = paraphrase(summary(tool), rng)
+        template = TEMPLATES[rng.integers(len(TEMPLATES))]
+        pairs.append((template.format(f"{text} in the {workspace} workspace"), names[i]))
+    return pairs
+
+
+def evaluate(db: ToolDB, queries: List[Tuple[str, str]], k: int) -> Dict:
+    ranks, latencies = [], []
+    for query, target in queries:
+        start = time.perf_counter()
+        ids = db.nearest(query, k=k)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        ranks.append(ids.index(target) + 1 if target in ids else math.inf)
+
+    ranks = np.array(ranks)
+    return {
+        "recall@1": float(np.mean(ranks <= 1)),
+        f"recall@{k}": float(np.mean(ranks <= k)),
+        f"mrr@{k}": float(np.mean(np.where(ranks <= k, 1 / ranks, 0.0))),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run(sizes: List[int], configs: List[str], k: int, n_queries: int, dim: int) -> Dict:
+    embedding = HashingEmbedding(dim)
+    results = []
+    for size in sizes:
+        tools, labels = build_catalog(size)
+        queries = build_queries(labels, n_queries)
+        for config in configs:
+            db = ToolDB(embedding, capacity=size, **CONFIGS[config](embedding.dim))
+            start = time.perf_counter()
+            db.upsert(tools)
+            build_s = time.perf_counter() - start
+
+            metrics = evaluate(db, queries, k)
+            results.append(
+                {
+                    "size": size,
+                    "config": config,
+                    "queries": len(queries),
+                    "build_s": build_s,
+                    "memory_bytes": db.nbytes,
+                    **metrics,
+                }
+            )
+            print(json.dumps(results[-1]), file=sys.stderr)
+
+    return {
+        "meta": {
+            "k": k,
+            "dim": dim,
+            "embedding": embedding.model_name,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float, latency_factor: float) -> List[str]:
+    """:return: Human readable regressions of report against baseline."""
+    # Only runs over the same catalog size, config and query set are comparable.
+    key = lambda r: (r["size"], r["config"], r["queries"])
+    previous = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        tag = f"{result['config']}@{result['size']}"
+        for metric, value in result.items():
+            if metric.startswith(("recall", "mrr")) and metric in old:
+                if value < old[metric] - tolerance:
+                    regressions.append(f"{tag}: {metric} {old[metric]:.3f} -> {value:.3f}")
+        if latency_factor and result["p99_ms"] > latency_factor * old["p99_ms"]:
+            regressions.append(
+                f"{tag}: p99 {old['p99_ms']:.2f}ms -> {result['p99_ms']:.2f}ms"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ToolDB retrieval benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--output", type=str, help="Write the JSON report to this path")
+    parser.add_argument("--baseline", type=str, help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed absolute quality drop")
+    parser.add_argument(
+        "--latency-factor",
+        type=float,
+        default=0.0,
+        help="Allowed p99 latency growth factor, 0 disables the latency check",
+    )
+    args = parser.parse_args()
+
+    report = run(args.sizes, args.configs, args.k, args.queries, args.dim)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.latency_factor)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Recall and latency of the IVF index against exact search in ToolDB.
+
+Synthetic tool vectors are drawn around random topic centres, as real schema
+embeddings cluster by domain, and queries are noisy copies of stored tools.
+
+Run with:
+    python benchmarks/tooldb_ann.py
+"""
+
+import time
+
+import numpy as np
+
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.vdb import ToolDB, IVFIndex
+
+SIZES = [50_000, 200_000]
+DIM = 384
+K = 5
+QUERIES = 200
+TOPICS = 2000
+
+
+class ClusteredEmbedding(BaseEmbedding):
+    """Embedding stub returning clustered random vectors."""
+
+    def __init__(self, dim: int = DIM, seed: int = 0):
+        super().__init__("clustered", dim)
+        self.rng = np.random.default_rng(seed)
+        self.topics = self.rng.standard_normal((TOPICS, dim)).astype(np.float32)
+
+    def batch_embed(self, texts):
+        topics = self.topics[self.rng.integers(0, TOPICS, len(texts))]
+        noise = self.rng.standard_normal((len(texts), self.dim)).astype(np.float32)
+        return topics + 0.6 * noise
+
+    def _embed_query(self, text):
+        return self.batch_embed([text])[0]
+
+
+def recall_at_k(approx, exact) -> float:
+    return float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)]))
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q)[0][0] for q in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def main():
+    embedding = ClusteredEmbedding()
+    print(f"{'tools':>8} {'nprobe':>6} {'exact ms':>9} {'ivf ms':>8} {'recall@k':>9}")
+    for size in SIZES:
+        db = ToolDB(embedding=embedding, capacity=size, index=IVFIndex())
+        start = time.perf_counter()
+        db.add([f"def tool_{i}():" for i in range(size)])
+        print(f"built {size} tools in {time.perf_counter() - start:.1f}s")
+
+        rows = embedding.rng.integers(0, size, QUERIES)
+        noise = embedding.rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+        queries = db.storage.decode(rows) + 0.02 * noise
+
+        exact, exact_ms = timed(lambda q: db.search_batch(q[None], K, db.exact), queries)
+        for nprobe in (4, 16, 64):
+            db.set_nprobe(nprobe)
+            approx, ivf_ms = timed(lambda q: db.search_batch(q[None], K), queries)
+            recall = recall_at_k(approx, exact)
+            print(f"{size:>8} {nprobe:>6} {exact_ms:>9.3f} {ivf_ms:>8.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
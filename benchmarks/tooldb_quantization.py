@@ -0,0 +1,55 @@
+"""
+Memory use, latency and recall of quantised ToolDB storage against float16 storage.
+
+Run with:
+    python benchmarks/tooldb_quantization.py
+"""
+
+import time
+
+import numpy as np
+
+from dria_agent.agent.vdb import ToolDB, Int8Storage, PQStorage, Float16Storage
+from tooldb_ann import ClusteredEmbedding, recall_at_k
+
+SIZES = [10_000, 100_000]
+DIM = 1024
+K = 5
+QUERIES = 100
+
+
+def timed(db, queries):
+    start = time.perf_counter()
+    results = [db.search(q, K)[0] for q in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def main():
+    print(f"{'tools':>8} {'storage':>8} {'MB':>8} {'ms':>8} {'recall@k':>9}")
+    for size in SIZES:
+        embedding = ClusteredEmbedding(dim=DIM)
+        vectors = embedding.batch_embed(range(size))
+        queries = vectors[embedding.rng.integers(0, size, QUERIES)]
+        queries = queries + 0.3 * embedding.rng.standard_normal(queries.shape)
+        texts = [f"def tool_{i}():" for i in range(size)]
+        rows = {text: row for row, text in enumerate(texts)}
+
+        reference = None
+        for name, storage in [
+            ("float16", Float16Storage(DIM)),
+            ("int8", Int8Storage(DIM)),
+            ("pq", PQStorage(DIM)),
+        ]:
+            embedding.batch_embed = lambda batch: vectors[[rows[t] for t in batch]]
+            db = ToolDB(embedding, size, storage=storage, ann_threshold=size + 1)
+            db.add(texts)
+            results, ms = timed(db, queries)
+            if reference is None:
+                reference = results
+            recall = recall_at_k(results, reference)
+            mb = db.storage.nbytes / 2**20
+            print(f"{size:>8} {name:>8} {mb:>8.1f} {ms:>8.3f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for ToolDB scoring.
+
+Compares the previous retrieval path (L2 distance over float16 vectors followed
+by a full argsort) against the cosine path (float32 inner product over
+pre-normalised vectors with argpartition top-k). ToolDB is pinned to ExactIndex so
+large sizes do not switch to the approximate IVF index.
+
+Run with:
+    python benchmarks/tooldb_search.py
+"""
+
+import time
+
+import numpy as np
+
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.vdb import ExactIndex, ToolDB
+
+SIZES = [1_000, 10_000, 100_000]
+DIM = 768
+K = 3
+QUERIES = 50
+
+
+class RandomEmbedding(BaseEmbedding):
+    """Embedding stub returning random vectors, so only scoring is measured."""
+
+    def __init__(self, dim: int = DIM, seed: int = 0):
+        super().__init__("random", dim)
+        self.rng = np.random.default_rng(seed)
+
+    def batch_embed(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim)).astype(np.float32)
+
+    def _embed_query(self, text):
+        return self.rng.standard_normal(self.dim).astype(np.float32)
+
+
+def legacy_nearest(vectors: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    q = np.array(q, dtype=vectors.dtype)
+    dists = np.linalg.norm(vectors - q, axis=1)
+    return np.argsort(dists)[:k]
+
+
+def bench(fn, queries) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1e3
+
+
+def main():
+    embedding = RandomEmbedding()
+    print(f"{'tools':>8} {'legacy ms':>10} {'cosine ms':>10} {'speedup':>8}")
+    for size in SIZES:
+        db = ToolDB(embedding=embedding, capacity=size, index=ExactIndex())
+        db.add([f"def tool_{i}():" for i in range(size)])
+        raw = embedding.rng.standard_normal((size, DIM)).astype(np.float16)
+        queries = embedding.rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+
+        legacy = bench(lambda q: legacy_nearest(raw, q, K), queries)
+        cosine = bench(lambda q: db.search(q, k=K), queries)
+        print(f"{size:>8} {legacy:>10.3f} {cosine:>10.3f} {legacy / cosine:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
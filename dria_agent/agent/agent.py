@@ -1,12 +1,14 @@
+import asyncio
 import copy
 import logging
-from typing import List, Literal, Callable
+from typing import List, Literal, Callable, Union
 
 from rich.console import Console
 from rich.logging import RichHandler
 
 from dria_agent.agent.settings.providers import PROVIDER_URLS
 from dria_agent.pythonic.schemas import ExecutionResults
+from .cache import DEFAULT_CACHE_DIR
 from .checkers import check_and_install_ollama
 from .mcp import MCPToolAdapter
 from .utils import *
@@ -36,6 +38,8 @@ class ToolCallingAgent(object):
         "mlx": HuggingFaceEmbedding,
         "ollama": OllamaEmbedding,
         "api": HuggingFaceEmbedding,
+        "onnx": OnnxEmbedding,
+        "service": ServiceEmbedding,
     }
 
     MODE_MAP = {
@@ -109,8 +113,25 @@ class ToolCallingAgent(object):
         tools: Optional[List] = None,
         backend: str = "ollama",
         mode: Literal["ultra_light", "fast", "balanced", "performant"] = "performant",
+        embedding_cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        embedding: Optional[str] = None,
         **kwargs,
     ):
+        """
+        Args:
+            mcp_file: Path to an MCP config JSON file
+            tools: List of functions decorated with @tool
+            backend: Inference backend, one of BACKENDS
+            mode: Model size preset, one of MODE_MAP
+            embedding_cache_dir: Directory for persisted tool schema embeddings, None disables caching
+            embedding: Embedding backend, one of EMBEDDING_MAP. Defaults to the one matching backend,
+                e.g. "onnx" runs the embedding model with ONNX Runtime on CPU and "service" uses the
+                host's shared embedding service (see dria_agent_embeddings)
+            kwargs: Extra arguments for the backend agent. `db_options` is forwarded to ToolDB and
+                `embedding_options` to the embedding model (e.g. query_cache_size, query_cache_ttl).
+                `sandbox` takes a ProcessSandbox that runs generated code in isolated worker processes
+                and `execution_timeout` a time budget in seconds for running it
+        """
         if mcp_file is None and tools is None:
             raise ValueError(
                 "Either mcp_file or tools must be provided. "
@@ -122,9 +143,11 @@ class ToolCallingAgent(object):
         tools = self._mcp_adapter.tools if self._mcp_adapter else tools
 
         agent_cls = self.BACKENDS.get(backend)
-        embedding_cls = self.EMBEDDING_MAP.get(backend)
-        if not agent_cls or not embedding_cls:
+        embedding_cls = self.EMBEDDING_MAP.get(embedding or backend)
+        if not agent_cls:
             raise ValueError(f"Unknown agent type: {backend}")
+        if not embedding_cls:
+            raise ValueError(f"Unknown embedding backend: {embedding}")
         if backend == "api":
             if "provider" not in kwargs:
                 raise ValueError("API provider not provided")
@@ -133,19 +156,25 @@ class ToolCallingAgent(object):
             if provider not in list(PROVIDER_URLS.keys()):
                 raise ValueError(f"Unknown provider: {provider}")
 
-            if provider == "ollama":
+            if provider == "ollama" and embedding is None:
                 embedding_cls = OllamaEmbedding
 
         model_pairs = self.MODE_MAP[mode][backend]
         if backend == "ollama":
             check_and_install_ollama(model_pairs[0], model_pairs[1])
 
+        db_options = {"cache_dir": embedding_cache_dir, **kwargs.pop("db_options", {})}
+        embedding_options = kwargs.pop("embedding_options", {})
+
         self.agent = agent_cls(
             model=model_pairs[0],
             embedding=embedding_cls(
-                model_name=model_pairs[1], dim=self.embedding_dims[model_pairs[1]]
+                model_name=model_pairs[1],
+                dim=self.embedding_dims[model_pairs[1]],
+                **embedding_options,
             ),
             tools=tools,
+            db_options=db_options,
             **kwargs,
         )
 
@@ -153,7 +182,11 @@ class ToolCallingAgent(object):
         """Asynchronously initialize the agent, including connecting to the MCP server."""
         if self._mcp_adapter:
             await self._mcp_adapter.connect_servers()
-            self.agent.set_tools(self._mcp_adapter.tools)
+            # Embedding the new tools runs off the event loop; retrieval keeps using the
+            # previous tool set until it is published.
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.agent.set_tools, self._mcp_adapter.tools
+            )
 
     async def close_servers(self):
         """Close the MCP server connection."""
@@ -178,7 +211,7 @@ class ToolCallingAgent(object):
         query: str,
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
         print_results: bool = True,
     ) -> ExecutionResults:
         """
@@ -188,7 +221,7 @@ class ToolCallingAgent(object):
             query: The query string to process
             dry_run: If True, don't execute tools, just return planned execution
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
 
         Returns:
@@ -206,7 +239,7 @@ class ToolCallingAgent(object):
         query: str,
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
         print_results: bool = True,
     ) -> ExecutionResults:
         """
@@ -216,7 +249,7 @@ class ToolCallingAgent(object):
             query: The query string to process
             dry_run: If True, don't execute tools, just return planned execution
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
 
         Returns:
@@ -234,7 +267,7 @@ class ToolCallingAgent(object):
         self,
         query: str,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
         print_results: bool = True,
         max_iterations: int = 3,
     ) -> ExecutionResults:
@@ -244,7 +277,7 @@ class ToolCallingAgent(object):
         Args:
             query: The query string to process
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
             max_iterations: Maximum number of feedback iterations
 
@@ -265,7 +298,7 @@ class ToolCallingAgent(object):
         self,
         query: str,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
         print_results: bool = True,
         max_iterations: int = 3,
     ) -> ExecutionResults:
@@ -275,7 +308,7 @@ class ToolCallingAgent(object):
         Args:
             query: The query string to process
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
             max_iterations: Maximum number of feedback iterations
 
@@ -295,7 +328,7 @@ class ToolCallingAgent(object):
         self,
         query: str,
         show_completion: bool,
-        num_tools: int,
+        num_tools: Union[int, str],
         print_results: bool,
         max_iterations: int,
     ) -> ExecutionResults:
@@ -305,7 +338,7 @@ class ToolCallingAgent(object):
         Args:
             query: The query string to process
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
             max_iterations: Maximum number of feedback iterations
 
@@ -373,7 +406,7 @@ class ToolCallingAgent(object):
         self,
         query: str,
         show_completion: bool,
-        num_tools: int,
+        num_tools: Union[int, str],
         print_results: bool,
         max_iterations: int,
         run_func: Callable,
@@ -384,7 +417,7 @@ class ToolCallingAgent(object):
         Args:
             query: The query string to process
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
             max_iterations: Maximum number of feedback iterations
             run_func: Function to use for running the agent (sync or async)
@@ -505,7 +538,7 @@ class ToolCallingAgent(object):
 
         Args:
             show_completion: Whether to show the agent's completion
-            num_tools: Number of tools to use for the query
+            num_tools: Number of tools to use for the query, or "auto" to pick it from retrieval scores
             print_results: Whether to print execution results
             max_iterations: Maximum number of feedback iterations for error correction
         """
@@ -0,0 +1,173 @@
+"""
+Persistent, content-addressed cache for tool schema embeddings.
+
+Embeddings are keyed by (embedding model, dim, sha256 of the rendered schema) and stored
+per model as an append-only float16 file that is memory-mapped on read, next to a small
+JSON manifest mapping schema hashes to rows.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from contextlib import contextmanager
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "DRIA_AGENT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "dria_agent"),
+)
+
+
+class EmbeddingCache:
+    DTYPE = np.float16
+
+    def __init__(self, model_name: str, dim: int, cache_dir: str = DEFAULT_CACHE_DIR):
+        """
+        :param model_name: Name of the embedding model the vectors come from.
+        :param dim: Embedding dimension.
+        :param cache_dir: Root directory of the cache.
+        """
+        self.model_name = model_name
+        self.dim = dim
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path = os.path.join(cache_dir, "embeddings", f"{slug}-{dim}")
+        self.vectors_path = os.path.join(self.path, "vectors.f16")
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._keys: Dict[str, int] = {}
+        self._rows = 0
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(str(text).encode("utf-8")).hexdigest()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _load(self) -> None:
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if manifest.get("model_name") != self.model_name or manifest.get("dim") != self.dim:
+            logger.warning("Ignoring embedding cache at %s, model mismatch", self.path)
+            return
+
+        # Never trust rows past what is actually on disk.
+        rows = min(manifest["rows"], self._rows_on_disk())
+        self._keys = {k: r for k, r in manifest["keys"].items() if r < rows}
+        self._rows = rows
+        self._vectors = None
+
+    def _rows_on_disk(self) -> int:
+        try:
+            size = os.path.getsize(self.vectors_path)
+        except OSError:
+            return 0
+        return size // (self.dim * np.dtype(self.DTYPE).itemsize)
+
+    def _mapped(self) -> np.ndarray:
+        if self._vectors is None or self._vectors.shape[0] < self._rows:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=self.DTYPE,
+                mode="r",
+                shape=(self._rows, self.dim),
+            )
+        return self._vectors
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, texts: List[str]) -> Tuple[List[int], np.ndarray, List[int]]:
+        """
+        Look up cached embeddings.
+
+        :param texts: Rendered tool schemas.
+        :return: (positions of hits in texts, vectors for the hits, positions of misses). The
+            vectors are a view of the mapping when the hit rows are contiguous and in order,
+            as for a tool set cached in one go, and a copy otherwise.
+        """
+        hits, rows, misses = [], [], []
+        for i, text in enumerate(texts):
+            row = self._keys.get(self.key(text))
+            if row is None:
+                misses.append(i)
+            else:
+                hits.append(i)
+                rows.append(row)
+
+        if not rows:
+            return hits, np.empty((0, self.dim), dtype=self.DTYPE), misses
+        mapped = self._mapped()
+        start = rows[0]
+        if rows == list(range(start, start + len(rows))):
+            return hits, mapped[start : start + len(rows)], misses
+        return hits, mapped[rows], misses
+
+    def put(self, texts: List[str], vectors: np.ndarray) -> None:
+        """
+        Store embeddings for texts, skipping the ones already cached.
+
+        :param texts: Rendered tool schemas.
+        :param vectors: Embeddings aligned with texts.
+        """
+        if len(texts) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=self.DTYPE).reshape(len(texts), self.dim)
+
+        try:
+            with self._lock():
+                # Another process may have appended since we loaded.
+                self._load()
+                new = {}
+                for text, vector in zip(texts, vectors):
+                    key = self.key(text)
+                    if key not in self._keys and key not in new:
+                        new[key] = vector
+                if not new:
+                    return
+
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(self._rows * self.dim * np.dtype(self.DTYPE).itemsize)
+                    f.write(np.stack(list(new.values())).tobytes())
+                for offset, key in enumerate(new):
+                    self._keys[key] = self._rows + offset
+                self._rows += len(new)
+
+                manifest = {
+                    "model_name": self.model_name,
+                    "dim": self.dim,
+                    "dtype": np.dtype(self.DTYPE).name,
+                    "rows": self._rows,
+                    "keys": self._keys,
+                }
+                tmp = f"{self.manifest_path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(manifest, f)
+                os.replace(tmp, self.manifest_path)
+        except OSError as e:
+            logger.warning("Could not write embedding cache at %s: %s", self.path, e)
@@ -1,4 +1,4 @@
-from typing import List, Union, Dict, Tuple, Callable
+from typing import List, Union, Dict, Tuple, Callable, Optional
 
 from rich.console import Console
 from rich.panel import Panel
@@ -6,6 +6,7 @@ from rich.panel import Panel
 from dria_agent.agent.clients.base import ToolCallingAgentBase
 from dria_agent.agent.settings.prompt import system_prompt
 from dria_agent.pythonic.engine import execute_tool_call, async_execute_tool_call
+from dria_agent.pythonic.sandbox import ProcessSandbox
 from dria_agent.pythonic.schemas import ExecutionResults
 from .api import OpenAICompatible
 
@@ -16,20 +17,25 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
         embedding,
         tools: List,
         model: str = "driaforall/Tiny-Agent-a-3B",
+        db_options: Optional[Dict] = None,
+        sandbox: Optional[ProcessSandbox] = None,
+        execution_timeout: Optional[float] = None,
         **kwargs
     ):
-        super().__init__(embedding, tools, model)
+        super().__init__(
+            embedding, tools, model, db_options, sandbox, execution_timeout
+        )
         self.provider = kwargs["provider"]
         self.client = OpenAICompatible()
 
     def _prepare_messages(
-        self, query: Union[str, List[Dict]], num_tools: int
+        self,
+        query: Union[str, List[Dict]],
+        num_tools: Union[int, str],
+        tools: Optional[List] = None,
     ) -> Tuple[List, List[Callable]]:
-        """Prepare messages and tools for execution"""
-        if num_tools <= 0 or num_tools > 5:
-            raise RuntimeError(
-                "Number of tools cannot be less than 0 or greater than 3 for optimal performance"
-            )
+        """Prepare messages and tools for execution, retrieving tools unless given"""
+        self._check_num_tools(num_tools)
 
         messages = (
             [{"role": "user", "content": query}]
@@ -37,17 +43,9 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
             else query.copy()
         )
 
-        # Get search query from user messages
-        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
-        search_query = (
-            user_msgs[-2]
-            if "Please re-think your response and fix errors" in user_msgs[-1]
-            else user_msgs[-1]
-        )
-
-        # Get relevant tools
-        inds = self.db.nearest(search_query, k=num_tools)
-        tools = [list(self.tools.values())[ind] for ind in inds]
+        # Get relevant tools, searching with the latest user message
+        if tools is None:
+            tools = self._retrieve_tools(self._search_query(messages), num_tools)
         tool_info = "\n".join(str(tool) for tool in tools)
 
         # Add system message
@@ -59,7 +57,7 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
             },
         )
 
-        return messages, [t.func for t in tools]
+        return messages, tools
 
     def _generate_content(self, messages: List[Dict]) -> str:
         """Generate content from messages"""
@@ -83,7 +81,7 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent synchronously"""
         messages, tools = self._prepare_messages(query, num_tools)
@@ -97,17 +95,22 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return execute_tool_call(completion=content, functions=tools)
+        return execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     async def async_run(
         self,
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent asynchronously"""
-        messages, tools = self._prepare_messages(query, num_tools)
+        messages, tools = await self._async_prepare_messages(query, num_tools)
         content = self._generate_content(messages)
 
         if show_completion:
@@ -118,7 +121,12 @@ class ApiToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return await async_execute_tool_call(completion=content, functions=tools)
+        return await async_execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     def instruct(self, query: Union[str, List[Dict]], show_completion: bool = False):
 
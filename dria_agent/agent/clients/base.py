@@ -1,30 +1,106 @@
 from abc import ABC, abstractmethod
-from typing import List, Union, Dict, Callable, Tuple
+from typing import List, Union, Dict, Callable, Tuple, Optional
 from dria_agent.pythonic.engine import ExecutionResults
 from dria_agent.agent.vdb import ToolDB
+from dria_agent.pythonic.sandbox import ProcessSandbox
+
+
+# Prefixes of the messages the feedback loops send back after failed executions.
+FEEDBACK_PREFIXES = (
+    "Please re-think your response and fix errors",
+    "Please re-think your code and fix errors",
+)
 
 
 class ToolCallingAgentBase(ABC):
 
-    def __init__(self, embedding, tools: List, model: str):
+    def __init__(
+        self,
+        embedding,
+        tools: List,
+        model: str,
+        db_options: Optional[Dict] = None,
+        sandbox: Optional[ProcessSandbox] = None,
+        execution_timeout: Optional[float] = None,
+    ):
         """
         :param tools: A list of tool objects. Each tool should have a .name attribute and be callable.
         :param model: The name of the model to use for chat inference.
+        :param db_options: Keyword arguments for the tool vector database (see ToolDB).
+        :param sandbox: Execute generated code in the worker processes of this sandbox.
+        :param execution_timeout: Time budget in seconds for executing generated code, tool calls included.
         """
         # Build a mapping from tool names to tool objects.
         self.tools = {tool.name: tool for tool in tools}
-        self.db = ToolDB(embedding=embedding)
-        schemas = [str(tool) for name, tool in self.tools.items()]
-        self.db.add(schemas)
+        self.db = ToolDB(embedding=embedding, **(db_options or {}))
+        self.db.upsert(list(self.tools.values()))
         self.model = model
+        self.sandbox = sandbox
+        self.execution_timeout = execution_timeout
+
+    @staticmethod
+    def _search_query(messages: List[Dict]) -> str:
+        """Return the latest user message that is not feedback from a failed execution."""
+        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
+        for content in reversed(user_msgs):
+            if not content.startswith(FEEDBACK_PREFIXES):
+                return content
+        return user_msgs[-1]
+
+    @staticmethod
+    def _check_num_tools(num_tools: Union[int, str]) -> None:
+        if num_tools == "auto":
+            return
+        if not isinstance(num_tools, int) or num_tools <= 0 or num_tools > 5:
+            raise RuntimeError(
+                "Number of tools must be between 1 and 5 for optimal performance, or \"auto\""
+            )
+
+    def _retrieve_tools(self, search_query: str, num_tools: Union[int, str]) -> List:
+        """
+        Return the num_tools tools most relevant to the search query. With "auto", the
+        number of tools is picked from the retrieval scores (see ToolDB.nearest_adaptive).
+        """
+        # Resolve ids against the snapshot they came from, set_tools may publish a new one.
+        snapshot = self.db.snapshot
+        if num_tools == "auto":
+            ids = self.db.nearest_adaptive(search_query, snapshot=snapshot)
+        else:
+            ids = self.db.nearest(search_query, k=num_tools, snapshot=snapshot)
+        return [snapshot.items[id] for id in ids]
+
+    async def _async_retrieve_tools(
+        self, search_query: str, num_tools: Union[int, str]
+    ) -> List:
+        """Like _retrieve_tools, embedding the query without blocking the event loop."""
+        snapshot = self.db.snapshot
+        if num_tools == "auto":
+            ids = await self.db.async_nearest_adaptive(search_query, snapshot=snapshot)
+        else:
+            ids = await self.db.async_nearest(
+                search_query, k=num_tools, snapshot=snapshot
+            )
+        return [snapshot.items[id] for id in ids]
 
     @abstractmethod
     def _prepare_messages(
-        self, query: Union[str, List[Dict]], num_tools: int
+        self,
+        query: Union[str, List[Dict]],
+        num_tools: Union[int, str],
+        tools: Optional[List] = None,
     ) -> Tuple[str, List[Callable]]:
-        """Prepare messages and tools for execution"""
+        """Prepare messages and tools for execution, retrieving tools unless given"""
         pass
 
+    async def _async_prepare_messages(
+        self, query: Union[str, List[Dict]], num_tools: Union[int, str]
+    ) -> Tuple[Union[str, List[Dict]], List[Callable]]:
+        """Like _prepare_messages, retrieving tools asynchronously"""
+        self._check_num_tools(num_tools)
+        messages = [{"role": "user", "content": query}] if isinstance(query, str) else query
+        tools = await self._async_retrieve_tools(self._search_query(messages), num_tools)
+        return self._prepare_messages(query, num_tools, tools=tools)
+
     @abstractmethod
     def _generate_content(self, messages: Union[List[Dict], str]) -> str:
         """Generate content from messages"""
@@ -49,7 +125,7 @@ class ToolCallingAgentBase(ABC):
         :param query: A string (query) or a list of message dicts for a conversation.
         :param dry_run: If True, returns the final response as a string instead of executing the tool.
         :param show_completion: If True, displays the completion in the console.
-        :param num_tools: The number of tools to use for the inference.
+        :param num_tools: The number of tools to use for the inference, or "auto" to pick it from retrieval scores.
         :return: The final response from the model.
         """
         pass
@@ -68,7 +144,7 @@ class ToolCallingAgentBase(ABC):
         :param query: A string (query) or a list of message dicts for a conversation.
         :param dry_run: If True, returns the final response as a string instead of executing the tool.
         :param show_completion: If True, displays the completion in the console.
-        :param num_tools: The number of tools to use for the inference.
+        :param num_tools: The number of tools to use for the inference, or "auto" to pick it from retrieval scores.
         :return: The final response from the model.
         """
         pass
@@ -89,5 +165,4 @@ class ToolCallingAgentBase(ABC):
         Set the tools for the agent.
         """
         self.tools = {tool.name: tool for tool in tools}
-        schemas = [str(tool) for name, tool in self.tools.items()]
-        self.db.add(schemas)
+        self.db.sync(list(self.tools.values()))
@@ -1,11 +1,14 @@
-from typing import List, Union, Dict, Callable, Tuple
+from typing import List, Union, Dict, Callable, Tuple, Optional
 import logging
 import importlib.util
+import weakref
 
 from dria_agent.agent.settings.prompt import system_prompt
 from .base import ToolCallingAgentBase
+from dria_agent.agent.registry import registry
 from dria_agent.pythonic.schemas import ExecutionResults
 from dria_agent.pythonic.engine import execute_tool_call, async_execute_tool_call
+from dria_agent.pythonic.sandbox import ProcessSandbox
 from rich.console import Console
 from rich.panel import Panel
 
@@ -19,27 +22,46 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
         tools: List,
         model: str = "driaforall/Tiny-Agent-a-3b",
         tokenizer: str = "driaforall/Tiny-Agent-a-3b",
+        db_options: Optional[Dict] = None,
+        sandbox: Optional[ProcessSandbox] = None,
+        execution_timeout: Optional[float] = None,
+        warm_up: bool = False,
     ):
-        super().__init__(embedding, tools, model)
+        """
+        :param warm_up: Load the weights now instead of on the first generation. Weights
+            are shared through the process-wide registry either way.
+        """
+        super().__init__(
+            embedding, tools, model, db_options, sandbox, execution_timeout
+        )
         if importlib.util.find_spec("transformers") is None:
             raise ImportError(
                 "Optional dependency 'transformers' is not installed. Install it with: pip install 'dria-agent[huggingface]'"
             )
         else:
             from transformers import AutoModelForCausalLM, AutoTokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer)
-        self.model = AutoModelForCausalLM.from_pretrained(model)
+        self.weights = registry.acquire(
+            ("transformers", model), lambda: AutoModelForCausalLM.from_pretrained(model)
+        )
+        self.tokenizer_weights = registry.acquire(
+            ("transformers_tokenizer", tokenizer),
+            lambda: AutoTokenizer.from_pretrained(tokenizer),
+        )
+        for handle in (self.weights, self.tokenizer_weights):
+            weakref.finalize(self, handle.release)
+            if warm_up:
+                handle.get()
         self.temperature = 0.5
         self.min_p = 0.95
 
     def _prepare_messages(
-        self, query: Union[str, List[Dict]], num_tools: int
+        self,
+        query: Union[str, List[Dict]],
+        num_tools: Union[int, str],
+        tools: Optional[List] = None,
     ) -> Tuple[str, List[Callable]]:
-        """Prepare messages and tools for execution"""
-        if num_tools <= 0 or num_tools > 5:
-            raise RuntimeError(
-                "Number of tools cannot be less than 0 or greater than 3 for optimal performance"
-            )
+        """Prepare messages and tools for execution, retrieving tools unless given"""
+        self._check_num_tools(num_tools)
 
         messages = (
             [{"role": "user", "content": query}]
@@ -47,17 +69,9 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
             else query.copy()
         )
 
-        # Get search query from user messages
-        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
-        search_query = (
-            user_msgs[-2]
-            if "Please re-think your response and fix errors" in user_msgs[-1]
-            else user_msgs[-1]
-        )
-
-        # Get relevant tools
-        inds = self.db.nearest(search_query, k=num_tools)
-        tools = [list(self.tools.values())[ind] for ind in inds]
+        # Get relevant tools, searching with the latest user message
+        if tools is None:
+            tools = self._retrieve_tools(self._search_query(messages), num_tools)
         tool_info = "\n".join(str(tool) for tool in tools)
 
         # Add system message
@@ -74,12 +88,16 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
             "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages) + "\n"
         )
 
-        return prompt, [t.func for t in tools]
+        return prompt, tools
+
+    @property
+    def tokenizer(self):
+        return self.tokenizer_weights.get()
 
     def _generate_content(self, prompt: str) -> str:
         """Generate content from prompt"""
         inputs = self.tokenizer(prompt, return_tensors="pt")
-        outputs = self.model.generate(
+        outputs = self.weights.get().generate(
             **inputs,
             max_new_tokens=1024,
             do_sample=True,
@@ -103,7 +121,7 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent synchronously"""
         prompt, tools = self._prepare_messages(query, num_tools)
@@ -117,17 +135,22 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return execute_tool_call(completion=content, functions=tools)
+        return execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     async def async_run(
         self,
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent asynchronously"""
-        prompt, tools = self._prepare_messages(query, num_tools)
+        prompt, tools = await self._async_prepare_messages(query, num_tools)
         content = self._generate_content(prompt)
 
         if show_completion:
@@ -138,7 +161,12 @@ class HuggingfaceToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return await async_execute_tool_call(completion=content, functions=tools)
+        return await async_execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     def instruct(self, query: Union[str, List[Dict]], show_completion: bool = False):
 
@@ -1,25 +1,41 @@
 import importlib.util
 import logging
 import math
+import weakref
 from functools import partial
-from typing import List, Union, Callable, Dict, Tuple
+from typing import List, Union, Callable, Dict, Tuple, Optional
 
 from rich.console import Console
 from rich.panel import Panel
 
 from dria_agent.agent.settings.prompt import system_prompt
 from dria_agent.pythonic.engine import execute_tool_call, async_execute_tool_call
+from dria_agent.pythonic.sandbox import ProcessSandbox
 from dria_agent.pythonic.schemas import ExecutionResults
 from .base import ToolCallingAgentBase
+from dria_agent.agent.registry import registry
 
 logger = logging.getLogger(__name__)
 
 
 class MLXToolCallingAgent(ToolCallingAgentBase):
     def __init__(
-        self, embedding, tools: List, model: str = "driaforall/Tiny-Agent-a-3B-Q8-mlx"
+        self,
+        embedding,
+        tools: List,
+        model: str = "driaforall/Tiny-Agent-a-3B-Q8-mlx",
+        db_options: Optional[Dict] = None,
+        sandbox: Optional[ProcessSandbox] = None,
+        execution_timeout: Optional[float] = None,
+        warm_up: bool = False,
     ):
-        super().__init__(embedding, tools, model)
+        """
+        :param warm_up: Load the weights now instead of on the first generation. Weights
+            are shared through the process-wide registry either way.
+        """
+        super().__init__(
+            embedding, tools, model, db_options, sandbox, execution_timeout
+        )
         if importlib.util.find_spec("mlx_lm") is None:
             raise ImportError(
                 "Optional dependency 'mlx_lm' is not installed. Install it with: pip install 'dria-agent[mlx]'"
@@ -117,17 +133,25 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
             return mx.take_along_axis(sorted_indices, sorted_tokens, axis=-1).squeeze(1)
 
         self.sampler = make_sampler(0.5, 0.9)
-        self.model, self.tokenizer = load(model)
+        # (model, tokenizer) as returned by mlx_lm.load
+        self.weights = registry.acquire(("mlx", model), lambda: load(model))
+        weakref.finalize(self, self.weights.release)
+        if warm_up:
+            self.weights.get()
         self.generate = generate
 
+    @property
+    def tokenizer(self):
+        return self.weights.get()[1]
+
     def _prepare_messages(
-        self, query: Union[str, List[Dict]], num_tools: int
+        self,
+        query: Union[str, List[Dict]],
+        num_tools: Union[int, str],
+        tools: Optional[List] = None,
     ) -> Tuple[str, List[Callable]]:
-        """Prepare messages and tools for execution"""
-        if num_tools <= 0 or num_tools > 5:
-            raise RuntimeError(
-                "Number of tools cannot be less than 0 or greater than 3 for optimal performance"
-            )
+        """Prepare messages and tools for execution, retrieving tools unless given"""
+        self._check_num_tools(num_tools)
 
         messages = (
             [{"role": "user", "content": query}]
@@ -135,17 +159,9 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
             else query.copy()
         )
 
-        # Get search query from user messages
-        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
-        search_query = (
-            user_msgs[-2]
-            if "Please re-think your response and fix errors" in user_msgs[-1]
-            else user_msgs[-1]
-        )
-
-        # Get relevant tools
-        inds = self.db.nearest(search_query, k=num_tools)
-        tools = [list(self.tools.values())[ind] for ind in inds]
+        # Get relevant tools, searching with the latest user message
+        if tools is None:
+            tools = self._retrieve_tools(self._search_query(messages), num_tools)
         tool_info = "\n".join(str(tool) for tool in tools)
 
         # Add system message
@@ -164,13 +180,14 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
             else "\n".join(f"{m['role']}: {m['content']}" for m in messages)
         )
 
-        return prompt, [t.func for t in tools]
+        return prompt, tools
 
     def _generate_content(self, prompt: str) -> str:
         """Generate content from prompt"""
+        model, tokenizer = self.weights.get()
         content = self.generate(
-            self.model,
-            self.tokenizer,
+            model,
+            tokenizer,
             prompt=prompt,
             verbose=False,
             max_tokens=750,
@@ -191,7 +208,7 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent synchronously"""
         prompt, tools = self._prepare_messages(query, num_tools)
@@ -205,17 +222,22 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return execute_tool_call(completion=content, functions=tools)
+        return execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     async def async_run(
         self,
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent asynchronously"""
-        prompt, tools = self._prepare_messages(query, num_tools)
+        prompt, tools = await self._async_prepare_messages(query, num_tools)
         content = self._generate_content(prompt)
 
         if show_completion:
@@ -226,7 +248,12 @@ class MLXToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return await async_execute_tool_call(completion=content, functions=tools)
+        return await async_execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     def instruct(self, query: Union[str, List[Dict]], show_completion: bool = False):
 
@@ -1,4 +1,4 @@
-from typing import List, Union, Dict, Callable, Tuple
+from typing import List, Union, Dict, Callable, Tuple, Optional
 import importlib.util
 import logging
 
@@ -6,6 +6,7 @@ from dria_agent.agent.settings.prompt import system_prompt
 from .base import ToolCallingAgentBase
 from dria_agent.pythonic.schemas import ExecutionResults
 from dria_agent.pythonic.engine import execute_tool_call, async_execute_tool_call
+from dria_agent.pythonic.sandbox import ProcessSandbox
 from rich.console import Console
 from rich.panel import Panel
 
@@ -14,9 +15,17 @@ logger = logging.getLogger(__name__)
 
 class OllamaToolCallingAgent(ToolCallingAgentBase):
     def __init__(
-        self, embedding, tools: List, model: str = "driaforall/tiny-agent-a:3b-q8_0"
+        self,
+        embedding,
+        tools: List,
+        model: str = "driaforall/tiny-agent-a:3b-q8_0",
+        db_options: Optional[Dict] = None,
+        sandbox: Optional[ProcessSandbox] = None,
+        execution_timeout: Optional[float] = None,
     ):
-        super().__init__(embedding, tools, model)
+        super().__init__(
+            embedding, tools, model, db_options, sandbox, execution_timeout
+        )
         if importlib.util.find_spec("ollama") is None:
             raise ImportError(
                 "Optional dependency 'ollama' is not installed. Install it with: pip install 'dria-agent[ollama]'"
@@ -27,13 +36,13 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
             self.chat = chat
 
     def _prepare_messages(
-        self, query: Union[str, List[Dict]], num_tools: int
+        self,
+        query: Union[str, List[Dict]],
+        num_tools: Union[int, str],
+        tools: Optional[List] = None,
     ) -> Tuple[List, List[Callable]]:
-        """Prepare messages and tools for execution"""
-        if num_tools <= 0 or num_tools > 5:
-            raise RuntimeError(
-                "Number of tools cannot be less than 0 or greater than 3 for optimal performance"
-            )
+        """Prepare messages and tools for execution, retrieving tools unless given"""
+        self._check_num_tools(num_tools)
 
         messages = (
             [{"role": "user", "content": query}]
@@ -41,17 +50,9 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
             else query.copy()
         )
 
-        # Get search query from user messages
-        user_msgs = [m["content"] for m in messages if m["role"] == "user"]
-        search_query = (
-            user_msgs[-2]
-            if "Please re-think your response and fix errors" in user_msgs[-1]
-            else user_msgs[-1]
-        )
-
-        # Get relevant tools
-        inds = self.db.nearest(search_query, k=num_tools)
-        tools = [list(self.tools.values())[ind] for ind in inds]
+        # Get relevant tools, searching with the latest user message
+        if tools is None:
+            tools = self._retrieve_tools(self._search_query(messages), num_tools)
         tool_info = "\n".join(str(tool) for tool in tools)
 
         # Add system message
@@ -63,7 +64,7 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
             },
         )
 
-        return messages, [t.func for t in tools]
+        return messages, tools
 
     def _generate_content(self, messages: List[Dict]) -> str:
         """Generate content from messages"""
@@ -87,7 +88,7 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent synchronously"""
         messages, tools = self._prepare_messages(query, num_tools)
@@ -101,17 +102,22 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return execute_tool_call(completion=content, functions=tools)
+        return execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     async def async_run(
         self,
         query: Union[str, List[Dict]],
         dry_run: bool = False,
         show_completion: bool = True,
-        num_tools: int = 2,
+        num_tools: Union[int, str] = 2,
     ) -> ExecutionResults:
         """Run agent asynchronously"""
-        messages, tools = self._prepare_messages(query, num_tools)
+        messages, tools = await self._async_prepare_messages(query, num_tools)
         content = self._generate_content(messages)
 
         if show_completion:
@@ -122,7 +128,12 @@ class OllamaToolCallingAgent(ToolCallingAgentBase):
                 content=content, results={}, data={}, errors=[], is_dry=True
             )
 
-        return await async_execute_tool_call(completion=content, functions=tools)
+        return await async_execute_tool_call(
+            completion=content,
+            functions=tools,
+            sandbox=self.sandbox,
+            timeout=self.execution_timeout,
+        )
 
     def instruct(self, query: Union[str, List[Dict]], show_completion: bool = False):
 
@@ -1,51 +1,652 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from functools import partial
+from typing import Union, List, Optional, Dict, Callable, Sequence, Set
+
 import numpy as np
 from abc import ABC, abstractmethod
-from typing import Union, List
 from dria_agent.agent.tool import ToolCall
+from dria_agent.agent.registry import registry
+from dria_agent.agent.cache import DEFAULT_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+QUERY_PREFIX = "Represent this sentence for searching relevant passages: "
+
+
+class QueryCache:
+    """Thread-safe LRU of normalised query text to embedding, with optional expiry."""
+
+    def __init__(self, size: int = 1024, ttl: Optional[float] = None):
+        """
+        :param size: Maximum number of cached queries, 0 disables caching.
+        :param ttl: Seconds after which an entry expires, None keeps entries until evicted.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, vector)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return " ".join(text.split())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, text: str, vector: np.ndarray) -> None:
+        if self.size <= 0:
+            return
+        vector = np.asarray(vector).reshape(-1)
+        vector.flags.writeable = False
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        key = self.key(text)
+        with self._lock:
+            self._entries[key] = (expires_at, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+        }
+
+
+def _weak_method(method: Callable) -> Callable:
+    """Call a bound method without keeping its instance alive."""
+    ref = weakref.WeakMethod(method)
+
+    def call(*args, **kwargs):
+        method = ref()
+        if method is None:
+            raise ReferenceError("The embedding was garbage collected")
+        return method(*args, **kwargs)
+
+    return call
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent embedding calls into single backend calls.
+
+    Callers block in submit() while a worker thread gathers requests for up to
+    max_wait_us (or until max_batch texts are queued), embeds them with one call and
+    hands every caller its own rows.
+    """
+
+    class _Request:
+        __slots__ = ("texts", "done", "result", "error")
+
+        def __init__(self, texts: Sequence):
+            self.texts = texts
+            self.done = threading.Event()
+            self.result: Optional[np.ndarray] = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(
+        self,
+        fn: Callable[[List], np.ndarray],
+        max_batch: int = 32,
+        max_wait_us: int = 500,
+    ):
+        """
+        :param fn: Backend call embedding a list of texts into an array of shape (texts, dim).
+        :param max_batch: Maximum number of texts per backend call. Larger requests are
+            sent on their own.
+        :param max_wait_us: Microseconds to wait for more requests after the first one.
+        """
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_us / 1e6
+        self.batches = 0
+        self.requests = 0
+        self._queue: "queue.Queue[MicroBatcher._Request]" = queue.Queue()
+        self._carry: Optional[MicroBatcher._Request] = None
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def close(self) -> None:
+        """Stop the worker thread once the requests queued before this are served."""
+        with self._lock:
+            self._closed = True
+            if self._worker is not None:
+                self._queue.put(None)
+
+    def submit(self, texts: Sequence) -> np.ndarray:
+        """Embed texts as part of the next batch and return their rows."""
+        request = self._Request(list(texts))
+        if not request.texts or self._closed:
+            return self.fn(request.texts)
+        self._ensure_worker()
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None and not self._closed:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> Optional[List["MicroBatcher._Request"]]:
+        first, self._carry = self._carry or self._queue.get(), None
+        if first is None:
+            return None
+        batch, size = [first], len(first.texts)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                request = (
+                    self._queue.get(timeout=timeout)
+                    if timeout > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+            if request is None:
+                # Stop after this batch.
+                self._queue.put(None)
+                break
+            if size + len(request.texts) > self.max_batch:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                vectors = np.asarray(self.fn([t for r in batch for t in r.texts]))
+                offset = 0
+                for request in batch:
+                    request.result = vectors[offset : offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].error = e
+                else:
+                    # One bad input should not fail the requests it was batched with.
+                    for request in batch:
+                        try:
+                            request.result = np.asarray(self.fn(request.texts))
+                        except Exception as e:
+                            request.error = e
+            for request in batch:
+                request.done.set()
 
 
 class BaseEmbedding(ABC):
-    def __init__(self, model_name: str, dim: int):
+    def __init__(
+        self,
+        model_name: str,
+        dim: int,
+        query_cache_size: int = 1024,
+        query_cache_ttl: Optional[float] = None,
+        micro_batch_size: int = 0,
+        micro_batch_wait_us: int = 500,
+    ):
+        """
+        :param model_name: Name of the embedding model.
+        :param dim: Embedding dimension.
+        :param query_cache_size: Number of query embeddings kept in the LRU, 0 disables it.
+        :param query_cache_ttl: Seconds a cached query embedding stays valid, None for no expiry.
+        :param micro_batch_size: Maximum texts per coalesced backend call when several
+            threads embed at once, 0 disables micro-batching.
+        :param micro_batch_wait_us: Microseconds a call waits for others to join its batch.
+        """
         self.model_name = model_name
         self.dim = dim
+        # Identifies the vectors in persistent caches: backends that produce different
+        # vectors for the same model must use different keys.
+        self.cache_key = model_name
+        self.query_cache = QueryCache(query_cache_size, query_cache_ttl)
+
+        self.query_batcher: Optional[MicroBatcher] = None
+        self.doc_batcher: Optional[MicroBatcher] = None
+        if micro_batch_size > 0:
+            self.enable_micro_batching(micro_batch_size, micro_batch_wait_us)
+
+    def enable_micro_batching(self, max_batch: int = 32, max_wait_us: int = 500) -> None:
+        """Coalesce concurrent query and document embedding calls, once."""
+        if self.query_batcher is not None:
+            return
+        # Batchers reach the embedding through weak references and stop with it, so a
+        # running worker thread does not keep the embedding, and its model, alive.
+        self.query_batcher = MicroBatcher(
+            _weak_method(self._batch_embed_query), max_batch, max_wait_us
+        )
+        self.doc_batcher = MicroBatcher(
+            _weak_method(self.batch_embed), max_batch, max_wait_us
+        )
+        weakref.finalize(self, self.query_batcher.close)
+        weakref.finalize(self, self.doc_batcher.close)
+        # Route document embedding through the batcher for every backend.
+        self.batch_embed = self.doc_batcher.submit
 
     @abstractmethod
     def batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
         pass
 
     @abstractmethod
-    def embed_query(self, text: str) -> np.ndarray:
+    def _embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query with the model, bypassing the cache."""
         pass
 
+    def _batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        """Embed several queries with the model, backends should override this with a single call."""
+        return np.stack([np.asarray(self._embed_query(t)).reshape(-1) for t in texts])
+
     def embed(self, text: Union[ToolCall, str]) -> np.ndarray:
         return self.batch_embed([text])[0]
 
+    def embed_query(self, text: str) -> np.ndarray:
+        vector = self.query_cache.get(text)
+        if vector is None:
+            if self.query_batcher is not None:
+                vector = self.query_batcher.submit([text])[0]
+            else:
+                vector = np.asarray(self._embed_query(text)).reshape(-1)
+            self.query_cache.put(text, vector)
+        return vector
+
+    def batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        vectors = [self.query_cache.get(t) for t in texts]
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            embed = (
+                self.query_batcher.submit
+                if self.query_batcher is not None
+                else self._batch_embed_query
+            )
+            embedded = embed([texts[i] for i in misses])
+            for i, vector in zip(misses, embedded):
+                vectors[i] = vector.reshape(-1)
+                self.query_cache.put(texts[i], vectors[i])
+        return np.stack(vectors)
+
+    # Async variants. The defaults run the blocking backend on a worker thread so the
+    # event loop stays free; backends with a native async client override the
+    # underscored methods.
+
+    async def async_batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
+        return await asyncio.to_thread(self.batch_embed, texts)
+
+    async def _async_embed_query(self, text: str) -> np.ndarray:
+        return await asyncio.to_thread(self._embed_query, text)
+
+    async def _async_batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self._batch_embed_query, texts)
+
+    async def async_embed_query(self, text: str) -> np.ndarray:
+        vector = self.query_cache.get(text)
+        if vector is None:
+            if self.query_batcher is not None:
+                embedded = await asyncio.to_thread(self.query_batcher.submit, [text])
+                vector = embedded[0]
+            else:
+                vector = np.asarray(await self._async_embed_query(text)).reshape(-1)
+            self.query_cache.put(text, vector)
+        return vector
+
+    async def async_batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        vectors = [self.query_cache.get(t) for t in texts]
+        misses = [i for i, v in enumerate(vectors) if v is None]
+        if misses:
+            pending = [texts[i] for i in misses]
+            if self.query_batcher is not None:
+                embedded = await asyncio.to_thread(self.query_batcher.submit, pending)
+            else:
+                embedded = await self._async_batch_embed_query(pending)
+            for i, vector in zip(misses, embedded):
+                vectors[i] = vector.reshape(-1)
+                self.query_cache.put(texts[i], vectors[i])
+        return np.stack(vectors)
+
 
 class OllamaEmbedding(BaseEmbedding):
-    def __init__(self, model_name: str = "snowflake-arctic-embed:m", dim: int = 768):
-        super().__init__(model_name, dim)
+    def __init__(
+        self,
+        model_name: str = "snowflake-arctic-embed:m",
+        dim: int = 768,
+        host: Optional[str] = None,
+        max_concurrency: int = 8,
+        max_keepalive_connections: int = 8,
+        keepalive_expiry: float = 30.0,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """
+        :param host: Ollama server URL used by the async client, defaults to OLLAMA_HOST.
+        :param max_concurrency: Maximum in-flight async embedding requests.
+        :param max_keepalive_connections: Idle connections the async client keeps open.
+        :param keepalive_expiry: Seconds an idle connection is kept open.
+        :param timeout: Request timeout in seconds for the async client, None for no limit.
+        """
+        super().__init__(model_name, dim, **kwargs)
         self.ollama = __import__("ollama")
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        # httpx clients are bound to the event loop they were first used on.
+        self._async_client = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._closing: Set[asyncio.Future] = set()
+
+    @staticmethod
+    async def _close_client(client) -> None:
+        close = getattr(client, "close", None)
+        if close is None:
+            # ollama < 0.6.2 has no public close; the pool lives in the httpx client.
+            close = client._client.aclose
+        try:
+            await close()
+        except Exception as e:
+            logger.debug(f"Could not close async Ollama client: {e}")
+
+    def _discard_client(self, client, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a client bound to another event loop, on that loop while it still runs."""
+        if loop is not None and loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(self._close_client(client), loop)
+        else:
+            # Its loop has finished: close what can still be closed from this one.
+            future = asyncio.ensure_future(self._close_client(client))
+        self._closing.add(future)
+        future.add_done_callback(self._closing.discard)
+
+    def _client(self):
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            import httpx
+
+            if self._async_client is not None:
+                self._discard_client(self._async_client, self._async_loop)
+
+            self._async_client = self.ollama.AsyncClient(
+                host=self.host,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+            )
+            self._async_loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_client
+
+    async def _async_embed(self, input: Union[str, List[str]]) -> np.ndarray:
+        client = self._client()
+        async with self._semaphore:
+            results = await client.embed(model=self.model_name, input=input)
+        return np.array(results.embeddings, dtype=np.float16)
+
+    async def aclose(self) -> None:
+        """Close the pooled async connections."""
+        if self._async_client is not None:
+            client, loop = self._async_client, self._async_loop
+            self._async_client = None
+            self._async_loop = None
+            if loop is asyncio.get_running_loop():
+                await self._close_client(client)
+            else:
+                self._discard_client(client, loop)
 
     def batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
         results = self.ollama.embed(model=self.model_name, input=texts)
         return np.array(results.embeddings, dtype=np.float16)
 
-    def embed_query(self, text: str) -> np.ndarray:
-        text = "Represent this sentence for searching relevant passages: " + text
+    def _embed_query(self, text: str) -> np.ndarray:
+        text = QUERY_PREFIX + text
         results = self.ollama.embed(model=self.model_name, input=text)
         return np.array(results.embeddings, dtype=np.float16)
 
+    def _batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        texts = [QUERY_PREFIX + t for t in texts]
+        results = self.ollama.embed(model=self.model_name, input=texts)
+        return np.array(results.embeddings, dtype=np.float16)
+
+    async def async_batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
+        if self.doc_batcher is not None:
+            return await super().async_batch_embed(texts)
+        return await self._async_embed(list(texts))
+
+    async def _async_embed_query(self, text: str) -> np.ndarray:
+        return await self._async_embed(QUERY_PREFIX + text)
+
+    async def _async_batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        return await self._async_embed([QUERY_PREFIX + t for t in texts])
+
 
 class HuggingFaceEmbedding(BaseEmbedding):
-    def __init__(self, dim: int = 768, model_name="Snowflake/snowflake-arctic-embed-m"):
-        super().__init__(model_name, dim)
+    def __init__(
+        self,
+        dim: int = 768,
+        model_name="Snowflake/snowflake-arctic-embed-m",
+        warm_up: bool = False,
+        **kwargs,
+    ):
+        """
+        :param warm_up: Load the model now instead of on the first embedding. The model
+            is shared through the process-wide registry either way.
+        """
+        super().__init__(model_name, dim, **kwargs)
         from sentence_transformers import SentenceTransformer
 
-        self.model = SentenceTransformer(model_name)
+        self.weights = registry.acquire(
+            ("sentence_transformers", model_name),
+            lambda: SentenceTransformer(model_name),
+        )
+        weakref.finalize(self, self.weights.release)
+        if warm_up:
+            self.weights.get()
+
+    @property
+    def model(self):
+        return self.weights.get()
 
     def batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
         return self.model.encode(texts)
 
-    def embed_query(self, text: str) -> np.ndarray:
-        text = "Represent this sentence for searching relevant passages: " + text
+    def _embed_query(self, text: str) -> np.ndarray:
+        text = QUERY_PREFIX + text
         return self.model.encode(text)
+
+    def _batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode([QUERY_PREFIX + t for t in texts])
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """
+    Runs snowflake-arctic-embed models on CPU with ONNX Runtime instead of PyTorch.
+
+    Weights come from the onnx/model.onnx export in the model's Hugging Face repository,
+    optionally int8 dynamically quantised once and cached on disk. Texts are tokenised
+    in batches sorted by length to keep padding small; embeddings are the normalised
+    CLS token, as for the SentenceTransformer model.
+    """
+
+    def __init__(
+        self,
+        dim: int = 768,
+        model_name: str = "Snowflake/snowflake-arctic-embed-m",
+        quantize: bool = True,
+        intra_op_threads: Optional[int] = None,
+        batch_size: int = 32,
+        max_length: int = 512,
+        model_path: Optional[str] = None,
+        tokenizer_path: Optional[str] = None,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        warm_up: bool = False,
+        **kwargs,
+    ):
+        """
+        :param model_name: Hugging Face repository. Ollama tags such as
+            "snowflake-arctic-embed:m" are mapped to their Hugging Face name.
+        :param quantize: Quantise weights to int8 with dynamic activation quantisation.
+        :param intra_op_threads: ONNX Runtime intra-op threads, None lets it decide.
+        :param batch_size: Texts per inference call.
+        :param max_length: Tokens per text, longer texts are truncated.
+        :param model_path: Local ONNX file used instead of downloading the export.
+        :param tokenizer_path: Local tokenizer.json used instead of downloading it.
+        :param cache_dir: Root directory for quantised models.
+        :param warm_up: Load the model now instead of on the first embedding.
+        """
+        if "/" not in model_name and ":" in model_name:
+            model_name = "Snowflake/" + model_name.replace(":", "-")
+        super().__init__(model_name, dim, **kwargs)
+        self.cache_key = f"{model_name}-onnx" + ("-int8" if quantize else "")
+        for module in ("onnxruntime", "tokenizers"):
+            if importlib.util.find_spec(module) is None:
+                raise ImportError(
+                    f"Optional dependency '{module}' is not installed. Install it with: pip install 'dria-agent[onnx]'"
+                )
+        self.batch_size = batch_size
+        # The loader must not reference self, the registry outlives embedders.
+        self.weights = registry.acquire(
+            ("onnx", model_path or model_name, quantize, intra_op_threads, max_length),
+            partial(
+                self._load,
+                model_name,
+                model_path,
+                tokenizer_path,
+                quantize,
+                intra_op_threads,
+                max_length,
+                cache_dir,
+            ),
+        )
+        weakref.finalize(self, self.weights.release)
+        if warm_up:
+            self.weights.get()
+
+    @staticmethod
+    def _load(
+        model_name: str,
+        model_path: Optional[str],
+        tokenizer_path: Optional[str],
+        quantize: bool,
+        intra_op_threads: Optional[int],
+        max_length: int,
+        cache_dir: str,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = model_path
+        if path is None:
+            from huggingface_hub import hf_hub_download
+
+            path = hf_hub_download(model_name, "onnx/model.onnx")
+        if quantize:
+            slug = (model_path or model_name).replace("/", "_").replace(os.sep, "_")
+            path = OnnxEmbedding._quantized(
+                path, os.path.join(cache_dir, "onnx", f"{slug}-int8.onnx")
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads is not None:
+            options.intra_op_num_threads = intra_op_threads
+        session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+
+        if tokenizer_path is not None:
+            tokenizer = Tokenizer.from_file(tokenizer_path)
+        else:
+            tokenizer = Tokenizer.from_pretrained(model_name)
+        tokenizer.enable_truncation(max_length)
+        tokenizer.enable_padding()
+        return session, tokenizer
+
+    @staticmethod
+    def _quantized(path: str, target: str) -> str:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{os.getpid()}.tmp"
+            quantize_dynamic(path, tmp, weight_type=QuantType.QInt8)
+            os.replace(tmp, target)
+        return target
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        session, tokenizer = self.weights.get()
+        inputs = {i.name for i in session.get_inputs()}
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        # Similar lengths share a batch, so little compute is spent on padding.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start : start + self.batch_size]
+            encodings = tokenizer.encode_batch([texts[i] for i in rows])
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array(
+                    [e.attention_mask for e in encodings], dtype=np.int64
+                ),
+                "token_type_ids": np.array(
+                    [e.type_ids for e in encodings], dtype=np.int64
+                ),
+            }
+            hidden = session.run(None, {k: v for k, v in feeds.items() if k in inputs})[0]
+            embeddings[rows] = hidden[:, 0]
+        embeddings /= np.maximum(
+            np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12
+        )
+        return embeddings
+
+    def batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
+        return self._encode([str(t) for t in texts])
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        return self._encode([QUERY_PREFIX + text])[0]
+
+    def _batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        return self._encode([QUERY_PREFIX + t for t in texts])
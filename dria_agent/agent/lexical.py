@@ -0,0 +1,177 @@
+"""
+Inverted index with BM25 scoring over tool names, parameter names and docstrings.
+
+Used by ToolDB next to the dense index, either fused with dense scores or on its own
+when a query names a tool directly.
+"""
+
+import copy
+import heapq
+import math
+import re
+from collections import Counter
+from typing import List, Tuple, Dict, Optional, Literal
+
+_IDENTIFIER = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into",
+    "is", "it", "of", "on", "or", "that", "the", "this", "to", "with", "me", "my",
+    "please", "can", "you", "i", "what", "param", "return", "def", "pass", "none",
+}
+
+
+def _stem(token: str) -> str:
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms. snake_case and camelCase identifiers yield both
+    their parts and the whole identifier, so "list_containers" matches "list containers".
+    """
+    tokens = []
+    for word in _IDENTIFIER.findall(text):
+        parts = [p for p in _CAMEL.sub("_", word).split("_") if p]
+        if len(parts) > 1:
+            tokens.append(word.lower())
+        tokens.extend(p.lower() for p in parts)
+    return [_stem(t) for t in tokens if t not in STOPWORDS]
+
+
+class BM25Index:
+    # Name terms are repeated so a match on the tool name outweighs one in a docstring.
+    NAME_BOOST = 3
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        fusion: Literal["rrf", "weighted"] = "rrf",
+        rrf_k: int = 60,
+        dense_weight: float = 0.5,
+        fast_path: bool = True,
+        margin: float = 1.5,
+        candidates: int = 20,
+    ):
+        """
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 length normalisation.
+        :param fusion: "rrf" for reciprocal rank fusion, "weighted" for a weighted sum of
+            min-max normalised scores.
+        :param rrf_k: Rank offset for reciprocal rank fusion.
+        :param dense_weight: Weight of the dense score in weighted fusion.
+        :param fast_path: Skip query embedding when the lexical match is confident.
+        :param margin: Minimum ratio of the best to the second best BM25 score to be confident.
+        :param candidates: Results taken from each retriever before fusion.
+        """
+        if fusion not in ("rrf", "weighted"):
+            raise ValueError(f"Unknown fusion: {fusion}")
+        self.k1 = k1
+        self.b = b
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.dense_weight = dense_weight
+        self.fast_path = fast_path
+        self.margin = margin
+        self.candidates = candidates
+
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {id: term frequency}
+        self.docs: Dict[str, Counter] = {}  # id -> term frequencies
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, id: str, text: str, name: Optional[str] = None) -> None:
+        """Index text under id, replacing any previous entry."""
+        self.remove(id)
+        tokens = tokenize(text)
+        if name:
+            tokens += tokenize(name) * self.NAME_BOOST
+        terms = Counter(tokens)
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[id] = tf
+        self.docs[id] = terms
+        self.lengths[id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def copy(self) -> "BM25Index":
+        """Independent copy: later writes to either index do not affect the other."""
+        other = copy.copy(self)
+        other.postings = {term: dict(posting) for term, posting in self.postings.items()}
+        # Term counters are replaced on add, never modified, so they can be shared.
+        other.docs = dict(self.docs)
+        other.lengths = dict(self.lengths)
+        return other
+
+    def remove(self, id: str) -> None:
+        terms = self.docs.pop(id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(id, None)
+            if not posting:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(id)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        :return: Up to k (id, BM25 score) pairs ordered by descending score.
+        """
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avgdl = self.total_length / n
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[id] / avgdl)
+                scores[id] = scores.get(id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+
+    def confident(self, query: str, hits: List[Tuple[str, float]], k: int) -> bool:
+        """
+        Whether lexical hits can be used without dense retrieval: there are at least k of
+        them, the best one contains every query term and clearly beats the runner-up.
+        """
+        if not self.fast_path or len(hits) < k or not hits:
+            return False
+        terms = set(tokenize(query))
+        if not terms or not terms.issubset(self.docs[hits[0][0]]):
+            return False
+        return len(hits) == 1 or hits[0][1] >= self.margin * hits[1][1]
+
+    def fuse(
+        self,
+        dense: List[Tuple[str, float]],
+        lexical: List[Tuple[str, float]],
+        k: int,
+    ) -> List[Tuple[str, float]]:
+        """Combine dense and lexical results into the top k by fused score."""
+        fused: Dict[str, float] = {}
+        if self.fusion == "rrf":
+            for results in (dense, lexical):
+                for rank, (id, _) in enumerate(results):
+                    fused[id] = fused.get(id, 0.0) + 1 / (self.rrf_k + rank + 1)
+        else:
+            for results, weight in (
+                (dense, self.dense_weight),
+                (lexical, 1 - self.dense_weight),
+            ):
+                if not results:
+                    continue
+                high, low = results[0][1], results[-1][1]
+                for id, score in results:
+                    norm = (score - low) / (high - low) if high > low else 1.0
+                    fused[id] = fused.get(id, 0.0) + weight * norm
+        return sorted(fused.items(), key=lambda x: -x[1])[:k]
@@ -11,6 +11,7 @@ class MCPServerConfig:
     command: str
     args: list[str]
     env: Optional[Dict[str, str]] = None
+    timeout: Optional[float] = None
 
 
 class MCPConfigManager:
@@ -54,6 +55,7 @@ class MCPConfigManager:
                         command=server_config["command"],
                         args=server_config["args"],
                         env=server_config.get("env"),
+                        timeout=server_config.get("timeout"),
                     )
         except Exception as e:
             raise ValueError(f"Failed to load MCP config from {config_file}: {str(e)}")
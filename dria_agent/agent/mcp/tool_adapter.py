@@ -7,7 +7,10 @@ from .config import MCPConfigManager
 
 
 def create_mcp_tool_executor(
-    client: MCPClient, tool_name: str, tool_info: Dict[str, Any]
+    client: MCPClient,
+    tool_name: str,
+    tool_info: Dict[str, Any],
+    timeout: Optional[float] = None,
 ) -> ToolCall:
     """Create a ToolCall instance that wraps an MCP tool
 
@@ -15,6 +18,7 @@ def create_mcp_tool_executor(
         client: MCPClient instance
         tool_name: Name of the MCP tool
         tool_info: Tool information from MCP server
+        timeout: Seconds after which a call to the tool is cancelled, None for no limit
 
     Returns:
         ToolCall instance that wraps the MCP tool
@@ -52,7 +56,7 @@ def create_mcp_tool_executor(
     tool_func.input_schema = tool_info.get("input_schema", None)
 
     # Wrap it with @tool decorator
-    return tool(tool_func)
+    return tool(tool_func, timeout=timeout)
 
 
 class MCPToolAdapter:
@@ -79,8 +83,11 @@ class MCPToolAdapter:
         self.clients[server_name] = client
 
         # Convert MCP tools to Dria Agent tools
+        timeout = self.config_manager.get_server_config(server_name).timeout
         for tool_info in client.available_tools:
-            tool_call = create_mcp_tool_executor(client, tool_info["name"], tool_info)
+            tool_call = create_mcp_tool_executor(
+                client, tool_info["name"], tool_info, timeout
+            )
             self._tools.append(tool_call)
 
     async def connect_servers(self) -> None:
@@ -0,0 +1,158 @@
+"""
+Process-wide registry of loaded models, shared by every agent and embedder.
+
+Owners acquire a handle per model and call handle.get() when they need the weights, so
+loading is lazy and happens once per process no matter how many agents use the model.
+Models are reference counted by their handles and can be unloaded after a period of
+inactivity; a handle reloads its model transparently on the next get().
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("loader", "model", "refs", "last_used", "lock")
+
+    def __init__(self, loader: Callable[[], Any]):
+        self.loader = loader
+        self.model: Any = None
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class ModelHandle:
+    """A reference to a registry model, loaded on the first get()."""
+
+    def __init__(self, registry: "ModelRegistry", key: Hashable):
+        self.registry = registry
+        self.key = key
+        self.released = False
+
+    def get(self) -> Any:
+        """Return the model, loading it if needed."""
+        if self.released:
+            raise RuntimeError(f"Model handle for {self.key} was released")
+        return self.registry._get(self.key)
+
+    def release(self) -> None:
+        """Drop this reference, safe to call more than once."""
+        if not self.released:
+            self.released = True
+            self.registry._release(self.key)
+
+
+class ModelRegistry:
+    def __init__(self, idle_timeout: Optional[float] = None):
+        """
+        :param idle_timeout: Seconds after which a model that was not used is unloaded.
+            None unloads models only when their last handle is released.
+        """
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self.idle_timeout = idle_timeout
+
+    @property
+    def idle_timeout(self) -> Optional[float]:
+        return self._idle_timeout
+
+    @idle_timeout.setter
+    def idle_timeout(self, value: Optional[float]) -> None:
+        self._idle_timeout = value
+        if value is not None and (self._sweeper is None or not self._sweeper.is_alive()):
+            self._sweeper = threading.Thread(target=self._sweep, daemon=True)
+            self._sweeper.start()
+
+    def acquire(self, key: Hashable, loader: Callable[[], Any]) -> ModelHandle:
+        """
+        Take a reference to the model under key without loading it.
+
+        :param key: Identity of the model, e.g. ("sentence_transformers", model_name).
+        :param loader: Builds the model, called at most once per load.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(loader)
+            entry.refs += 1
+        return ModelHandle(self, key)
+
+    def warm_up(self, key: Hashable, loader: Callable[[], Any]) -> ModelHandle:
+        """Like acquire, but load the model right away."""
+        handle = self.acquire(key, loader)
+        handle.get()
+        return handle
+
+    def _get(self, key: Hashable) -> Any:
+        entry = self._entries[key]
+        entry.last_used = time.monotonic()
+        model = entry.model
+        if model is None:
+            with entry.lock:
+                if entry.model is None:
+                    logger.info(f"Loading model {key}")
+                    entry.model = entry.loader()
+                model = entry.model
+        return model
+
+    def _release(self, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries[key]
+            entry.refs -= 1
+            if entry.refs == 0 and self._idle_timeout is None:
+                # Nobody can reach the model anymore and it is not kept for reuse.
+                del self._entries[key]
+
+    def evict_idle(self, max_idle: Optional[float] = None) -> List[Hashable]:
+        """
+        Unload models not used for max_idle seconds. Unreferenced models are forgotten,
+        referenced ones reload on their next get().
+
+        :param max_idle: Defaults to idle_timeout, 0 unloads every model.
+        :return: Keys of the unloaded models.
+        """
+        max_idle = self._idle_timeout if max_idle is None else max_idle
+        if max_idle is None:
+            return []
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry.last_used < max_idle:
+                    continue
+                with entry.lock:
+                    if entry.model is not None:
+                        entry.model = None
+                        evicted.append(key)
+                if entry.refs == 0:
+                    del self._entries[key]
+        for key in evicted:
+            logger.info(f"Unloaded idle model {key}")
+        return evicted
+
+    def _sweep(self) -> None:
+        while self._idle_timeout is not None:
+            time.sleep(max(self._idle_timeout / 2, 1.0))
+            self.evict_idle()
+
+    def stats(self) -> Dict[Hashable, Dict[str, Any]]:
+        """Reference count, load state and idle seconds per model."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: {
+                    "refs": entry.refs,
+                    "loaded": entry.model is not None,
+                    "idle": now - entry.last_used,
+                }
+                for key, entry in self._entries.items()
+            }
+
+
+registry = ModelRegistry()
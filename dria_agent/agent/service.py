@@ -0,0 +1,327 @@
+"""
+Local embedding service shared by the agent processes of a host.
+
+One EmbeddingServer process owns the embedding model and listens on a Unix domain
+socket. Worker processes embed through ServiceEmbedding, a BaseEmbedding client, so the
+model is loaded once per host instead of once per worker. Concurrent requests from all
+workers are coalesced into single backend calls by the embedding's micro-batchers, and
+query embeddings are cached server side for every worker.
+
+Frames are a 4 byte big-endian length followed by the payload. Requests are JSON
+objects {"op": "info" | "query" | "docs", "texts": [...]}; responses are a JSON header
+frame ({"shape": [n, dim]} or {"error": ..., "status_code": ...}) followed, on success,
+by a frame of float32 rows.
+
+Run the server with:
+    dria_agent_embeddings --embedding ollama --model snowflake-arctic-embed:m --dim 768
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from ollama import ResponseError
+
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.tool import ToolCall
+
+logger = logging.getLogger(__name__)
+
+# Per user, so that other users of the host cannot connect to, or squat on, the socket.
+_USER_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+    tempfile.gettempdir(), f"dria-agent-{os.getuid()}"
+)
+DEFAULT_SOCKET_PATH = os.environ.get(
+    "DRIA_AGENT_EMBEDDING_SOCKET",
+    os.path.join(_USER_DIR, "dria-agent-embedding.sock"),
+)
+
+_LENGTH = struct.Struct(">I")
+
+
+def _send(sock: socket.socket, *frames: bytes) -> None:
+    sock.sendall(b"".join(_LENGTH.pack(len(f)) + f for f in frames))
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    while n:
+        received = sock.recv_into(view[len(buffer) - n :], n)
+        if received == 0:
+            raise ConnectionError("Embedding service closed the connection")
+        n -= received
+    return bytes(buffer)
+
+
+def _recv(sock: socket.socket) -> bytes:
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, length)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "EmbeddingServer"
+
+    def handle(self) -> None:
+        # One thread per worker connection; requests on it are served in order.
+        try:
+            while True:
+                self.respond(json.loads(_recv(self.request)))
+        except ConnectionError:
+            # The worker went away.
+            return
+
+    def respond(self, request: Dict[str, Any]) -> None:
+        try:
+            header, payload = self.server.dispatch(request)
+        except Exception as e:
+            logger.warning(f"Embedding request failed: {e}")
+            error = {
+                "error": getattr(e, "error", str(e)),
+                "status_code": getattr(e, "status_code", None),
+            }
+            _send(self.request, json.dumps(error).encode())
+            return
+        frames = [json.dumps(header).encode()]
+        if payload is not None:
+            frames.append(payload.tobytes())
+        _send(self.request, *frames)
+
+
+def _listening(path: str) -> bool:
+    """Whether a server accepts connections on the Unix socket at path."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _private_dir(path: str) -> None:
+    """Create directory path for the current user only, or check that it is."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(
+            f"{path} must be owned by the current user and inaccessible to others"
+        )
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        embedding: BaseEmbedding,
+        path: str = DEFAULT_SOCKET_PATH,
+        max_batch: int = 64,
+        max_wait_us: int = 2000,
+    ):
+        """
+        :param embedding: Embedding backend served to the clients.
+        :param path: Unix socket path, only accessible to the current user. A stale
+            socket file left by a previous server is replaced; a path another server
+            still answers on raises RuntimeError.
+        :param max_batch: Maximum texts per backend call, across all connected workers.
+        :param max_wait_us: Microseconds a request waits for others to join its batch.
+        """
+        if os.path.dirname(path) == _USER_DIR:
+            _private_dir(_USER_DIR)
+        if os.path.exists(path):
+            if _listening(path):
+                raise RuntimeError(f"An embedding server is already listening on {path}")
+            os.unlink(path)
+        self.embedding = embedding
+        self.path = path
+        embedding.enable_micro_batching(max_batch, max_wait_us)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+        self._thread: Optional[threading.Thread] = None
+
+    def dispatch(self, request: Dict[str, Any]) -> Tuple[Dict, Optional[np.ndarray]]:
+        op = request.get("op")
+        if op == "info":
+            return {
+                "model_name": self.embedding.model_name,
+                "cache_key": self.embedding.cache_key,
+                "dim": self.embedding.dim,
+            }, None
+        texts = request.get("texts", [])
+        if op == "query":
+            vectors = self.embedding.batch_embed_query(texts)
+        elif op == "docs":
+            vectors = self.embedding.batch_embed(texts)
+        else:
+            raise ValueError(f"Unknown operation: {op}")
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        return {"shape": list(vectors.shape)}, vectors
+
+    def start(self) -> "EmbeddingServer":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def close(self) -> None:
+        """Stop serving and remove the socket file."""
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+
+
+class ServiceEmbedding(BaseEmbedding):
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        dim: Optional[int] = None,
+        path: str = DEFAULT_SOCKET_PATH,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        """
+        Client of an EmbeddingServer. The model name and dimension are taken from the
+        server, so tool embeddings cached by other backends of the same model are reused.
+
+        :param model_name: Expected model, a mismatch with the served one is logged.
+        :param dim: Expected embedding dimension, must match the served one.
+        :param path: Unix socket path of the server.
+        :param timeout: Socket timeout in seconds, None for no limit.
+        """
+        self.path = path
+        self.timeout = timeout
+        # One connection per thread, so concurrent calls are batched by the server
+        # instead of queueing on a shared socket.
+        self._local = threading.local()
+        info, _ = self._request({"op": "info"})
+        if dim is not None and dim != info["dim"]:
+            raise ValueError(
+                f"Embedding service at {path} serves dimension {info['dim']}, expected {dim}"
+            )
+        if model_name is not None and model_name != info["model_name"]:
+            logger.warning(
+                f"Embedding service at {path} serves {info['model_name']}, not {model_name}"
+            )
+        super().__init__(info["model_name"], info["dim"], **kwargs)
+        self.cache_key = info.get("cache_key", info["model_name"])
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError as e:
+                sock.close()
+                raise ConnectionError(
+                    f"Embedding service is not reachable at {self.path}. Start it with: "
+                    "dria_agent_embeddings"
+                ) from e
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, request: Dict[str, Any]) -> Tuple[Dict, Optional[np.ndarray]]:
+        body = json.dumps(request).encode()
+        for attempt in range(2):
+            sock = self._connect()
+            try:
+                _send(sock, body)
+                header = json.loads(_recv(sock))
+                if "error" in header:
+                    if header.get("status_code") is not None:
+                        # Lets ToolDB isolate texts the served model rejects.
+                        raise ResponseError(header["error"], header["status_code"])
+                    raise RuntimeError(f"Embedding service error: {header['error']}")
+                payload = None
+                if "shape" in header:
+                    payload = np.frombuffer(_recv(sock), dtype=np.float32)
+                    payload = payload.reshape(header["shape"])
+                return header, payload
+            except socket.timeout:
+                # A late response would be read as the answer to the next request.
+                self._disconnect()
+                raise
+            except ConnectionError:
+                # The server restarted since the last request: reconnect once.
+                self._disconnect()
+                if attempt:
+                    raise
+
+    def close(self) -> None:
+        """Close this thread's connection."""
+        self._disconnect()
+
+    def _embed(self, op: str, texts: List[str]) -> np.ndarray:
+        _, vectors = self._request({"op": op, "texts": texts})
+        return vectors
+
+    def batch_embed(self, texts: List[Union[ToolCall, str]]) -> np.ndarray:
+        return self._embed("docs", [str(t) for t in texts])
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        return self._embed("query", [text])[0]
+
+    def _batch_embed_query(self, texts: List[str]) -> np.ndarray:
+        return self._embed("query", list(texts))
+
+
+def main():
+    from dria_agent.agent.utils import EMBEDDING_MAP
+
+    parser = argparse.ArgumentParser(description="dria_agent embedding service.")
+    parser.add_argument(
+        "--embedding",
+        choices=sorted(set(EMBEDDING_MAP) - {"service"}),
+        default="ollama",
+        help="Embedding backend",
+    )
+    parser.add_argument("--model", type=str, help="Embedding model, backend default if omitted")
+    parser.add_argument("--dim", type=int, help="Embedding dimension, backend default if omitted")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET_PATH)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-us", type=int, default=2000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    options = {}
+    if args.model:
+        options["model_name"] = args.model
+    if args.dim:
+        options["dim"] = args.dim
+    embedding = EMBEDDING_MAP[args.embedding](**options)
+    server = EmbeddingServer(embedding, args.socket, args.max_batch, args.max_wait_us)
+    logger.info(f"Serving {embedding.model_name} on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
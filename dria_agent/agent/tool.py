@@ -1,13 +1,20 @@
 import inspect
 import logging
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
 
 class ToolCall:
-    def __init__(self, func):
+    def __init__(
+        self, func, timeout: Optional[float] = None, parallel_safe: bool = False
+    ):
         self.func = func
         self.name = func.__name__
+        # Seconds a call may run, and whether independent calls may run at the same
+        # time. The engine reads both from the ToolCall, func is left untouched.
+        self.timeout = timeout
+        self.parallel_safe = parallel_safe
         self.docstring = func.__doc__ or ""
         if self.docstring == "":
             logger.info(
@@ -97,12 +104,18 @@ class ToolCall:
         return f"{sig_line}\n{doc_block}\n    pass"
 
 
-def tool(func):
+def tool(func=None, *, timeout: Optional[float] = None, parallel_safe: bool = False):
     """
     Decorator that converts a function into a ToolCall instance,
     extracting its parameters, return type, and docstring.
+
+    Use as @tool, or @tool(timeout=10) to stop waiting for a call after 10 seconds.
+    @tool(parallel_safe=True) lets independent consecutive calls of the tool run at
+    the same time; only mark tools without side effects other calls depend on.
     """
-    return ToolCall(func)
+    if func is None:
+        return lambda f: ToolCall(f, timeout=timeout, parallel_safe=parallel_safe)
+    return ToolCall(func, timeout=timeout, parallel_safe=parallel_safe)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,12 @@ from dria_agent.agent.clients.hfc import HuggingfaceToolCallingAgent
 from dria_agent.agent.clients.ollmc import OllamaToolCallingAgent
 from dria_agent.agent.clients.mlxc import MLXToolCallingAgent
 from dria_agent.agent.clients.apic import ApiToolCallingAgent
-from dria_agent.agent.embedder import OllamaEmbedding, HuggingFaceEmbedding
+from dria_agent.agent.embedder import (
+    OllamaEmbedding,
+    HuggingFaceEmbedding,
+    OnnxEmbedding,
+)
+from dria_agent.agent.service import ServiceEmbedding
 from typing import Optional
 from rich.panel import Panel
 
@@ -18,6 +23,8 @@ EMBEDDING_MAP = {
     "mlx": HuggingFaceEmbedding,
     "ollama": OllamaEmbedding,
     "api": HuggingFaceEmbedding,
+    "onnx": OnnxEmbedding,
+    "service": ServiceEmbedding,
 }
 
 MODE_MAP = {
@@ -2,43 +2,1277 @@
 A simple, lightweight vector database for handling tools larger/longer than context size.
 """
 
+import copy
 import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Tuple, List, Optional, Any, Dict, Union
 
 import numpy as np
 from ollama import ResponseError
 
+from .cache import EmbeddingCache
 from .embedder import BaseEmbedding
+from .lexical import BM25Index
 
 logger = logging.getLogger(__name__)
 
 
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalise vectors along the last axis in float32.
+
+    Zero vectors are left as zeros instead of producing NaNs.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the first dim components (Matryoshka embeddings) and renormalise."""
+    vectors = np.asarray(vectors)
+    if vectors.shape[-1] == dim:
+        return normalize(vectors)
+    return normalize(vectors[..., :dim])
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k highest scores along the last axis without sorting the whole array.
+
+    :param scores: Similarity scores of shape (n,) or (queries, n).
+    :param k: Number of results to return.
+    :return: (indices, scores) ordered by descending score, with k along the last axis.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        shape = scores.shape[:-1] + (0,)
+        return np.empty(shape, dtype=np.int64), np.empty(shape, dtype=np.float32)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape)
+    order = np.argsort(
+        -np.take_along_axis(scores, candidates, axis=-1), axis=-1, kind="stable"
+    )
+    indices = np.take_along_axis(candidates, order, axis=-1)
+    return indices, np.take_along_axis(scores, indices, axis=-1)
+
+
+def _tool_name(text: str) -> str:
+    """Function name of a rendered tool schema, for log messages."""
+    words = text.split()
+    return words[1].split("(")[0] if len(words) > 1 else text[:32]
+
+
+def split_text(text: str, min_length: int = 64) -> Optional[List[str]]:
+    """
+    Split a tool schema in two for embedding the halves separately. The first line (the
+    signature) is repeated in both halves so each stays anchored to its tool.
+
+    :return: Two pieces, or None if the text is too short to split further.
+    """
+    header, _, body = text.partition("\n")
+    if not body:
+        header, body = "", text
+    if len(body) < 2 * min_length:
+        return None
+    lines = body.splitlines(keepends=True)
+    if len(lines) > 1:
+        mid = len(lines) // 2
+        halves = "".join(lines[:mid]), "".join(lines[mid:])
+    else:
+        cut = body.rfind(" ", 0, len(body) // 2 + 1)
+        cut = cut if cut > 0 else len(body) // 2
+        halves = body[:cut], body[cut:]
+    return [f"{header}\n{half}" if header else half for half in halves]
+
+
+class VectorStorage(ABC):
+    """
+    Row storage for normalised vectors. Rows are appended and only ever removed by keep().
+    """
+
+    MIN_CAPACITY = 64
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.size = 0
+
+    @property
+    @abstractmethod
+    def capacity(self) -> int:
+        pass
+
+    @property
+    @abstractmethod
+    def nbytes(self) -> int:
+        pass
+
+    @abstractmethod
+    def reserve(self, capacity: int) -> None:
+        """Make room for at least capacity rows."""
+        pass
+
+    @abstractmethod
+    def append(self, vectors: np.ndarray) -> None:
+        """Append normalised float32 vectors as rows [size, size + n)."""
+        pass
+
+    @abstractmethod
+    def keep(self, rows: np.ndarray) -> None:
+        """Keep only the given rows, renumbered in order."""
+        pass
+
+    @abstractmethod
+    def decode(self, rows: Union[slice, np.ndarray]) -> np.ndarray:
+        """Reconstruct rows as float32 vectors."""
+        pass
+
+    def score(self, queries: np.ndarray, rows: Union[slice, np.ndarray]) -> np.ndarray:
+        """Inner products of float32 queries (n, dim) with rows, of shape (n, rows)."""
+        return queries @ self.decode(rows).T
+
+    def view(self) -> "VectorStorage":
+        """
+        Read-only view of the current rows. Storages never modify rows below size in
+        place (growing and keep() allocate new arrays), so a shallow copy with its own
+        size is unaffected by later writes.
+        """
+        return copy.copy(self)
+
+    def _grow(self, n: int) -> None:
+        if self.size + n > self.capacity:
+            self.reserve(max(2 * self.capacity, self.size + n, self.MIN_CAPACITY))
+
+
+class Float16Storage(VectorStorage):
+    """Full precision storage, 2 bytes per dimension."""
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.data = np.zeros((0, dim), dtype=np.float16)
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def reserve(self, capacity: int) -> None:
+        if capacity <= self.capacity:
+            return
+        data = np.zeros((capacity, self.dim), dtype=np.float16)
+        data[: self.size] = self.data[: self.size]
+        self.data = data
+
+    def append(self, vectors: np.ndarray) -> None:
+        self._grow(len(vectors))
+        self.data[self.size : self.size + len(vectors)] = vectors
+        self.size += len(vectors)
+
+    def keep(self, rows: np.ndarray) -> None:
+        data = np.zeros((max(2 * len(rows), self.MIN_CAPACITY), self.dim), np.float16)
+        data[: len(rows)] = self.data[rows]
+        self.data, self.size = data, len(rows)
+
+    def decode(self, rows):
+        return self.data[rows].astype(np.float32)
+
+
+class Int8Storage(VectorStorage):
+    """Scalar quantisation to int8 with a per-vector scale, 1 byte per dimension."""
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.codes = np.zeros((0, dim), dtype=np.int8)
+        self.scales = np.zeros(0, dtype=np.float32)
+
+    @property
+    def capacity(self) -> int:
+        return self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def reserve(self, capacity: int) -> None:
+        if capacity <= self.capacity:
+            return
+        codes = np.zeros((capacity, self.dim), dtype=np.int8)
+        codes[: self.size] = self.codes[: self.size]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[: self.size] = self.scales[: self.size]
+        self.codes, self.scales = codes, scales
+
+    def append(self, vectors: np.ndarray) -> None:
+        self._grow(len(vectors))
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.maximum(scales, np.finfo(np.float32).tiny)
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        self.codes[self.size : self.size + len(vectors)] = codes
+        self.scales[self.size : self.size + len(vectors)] = scales
+        self.size += len(vectors)
+
+    def keep(self, rows: np.ndarray) -> None:
+        capacity = max(2 * len(rows), self.MIN_CAPACITY)
+        codes = np.zeros((capacity, self.dim), dtype=np.int8)
+        codes[: len(rows)] = self.codes[rows]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[: len(rows)] = self.scales[rows]
+        self.codes, self.scales, self.size = codes, scales, len(rows)
+
+    def decode(self, rows):
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+    def score(self, queries, rows):
+        # Asymmetric: the query stays in float32, the scale is applied after the product.
+        return (queries @ self.codes[rows].astype(np.float32).T) * self.scales[rows]
+
+
+class PQStorage(VectorStorage):
+    """
+    Product quantisation: each vector is split into m sub-vectors, each stored as the
+    uint8 id of its nearest codebook centroid, m bytes per vector.
+
+    Codebooks need data to train on, so rows are kept in float16 until train_size rows
+    have been added. Scoring uses asymmetric distance computation: per query, a
+    (m, ksub) table of sub-vector inner products is built once and summed over codes.
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        m: Optional[int] = None,
+        ksub: int = 256,
+        train_size: int = 4096,
+        iterations: int = 10,
+        seed: int = 0,
+    ):
+        """
+        :param dim: Vector dimension.
+        :param m: Number of sub-vectors, must divide dim. Defaults to dim // 8.
+        :param ksub: Centroids per sub-vector codebook, at most 256.
+        :param train_size: Number of rows to collect before training the codebooks.
+        :param iterations: k-means iterations.
+        :param seed: Seed for k-means initialisation.
+        """
+        super().__init__(dim)
+        self.m = m or max(1, dim // 8)
+        if dim % self.m:
+            raise ValueError(f"PQ sub-vector count {self.m} must divide dim {dim}")
+        self.dsub = dim // self.m
+        self.ksub = min(ksub, 256)
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None  # (m, ksub, dsub)
+        self.codes = np.zeros((0, self.m), dtype=np.uint8)
+        self.raw: Optional[Float16Storage] = Float16Storage(dim)
+
+    @property
+    def capacity(self) -> int:
+        return self.raw.capacity if self.raw is not None else self.codes.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        if self.raw is not None:
+            return self.raw.nbytes
+        return self.codes.nbytes + self.codebooks.nbytes
+
+    def reserve(self, capacity: int) -> None:
+        if self.raw is not None:
+            self.raw.reserve(capacity)
+        elif capacity > self.capacity:
+            codes = np.zeros((capacity, self.m), dtype=np.uint8)
+            codes[: self.size] = self.codes[: self.size]
+            self.codes = codes
+
+    def train(self, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(self.seed)
+        ksub = min(self.ksub, len(vectors))
+        sub = vectors.reshape(len(vectors), self.m, self.dsub)
+        self.codebooks = np.zeros((self.m, ksub, self.dsub), dtype=np.float32)
+        for j in range(self.m):
+            x = sub[:, j]
+            centroids = x[rng.choice(len(x), ksub, replace=False)]
+            for _ in range(self.iterations):
+                assignments = self._nearest(x, centroids)
+                counts = np.bincount(assignments, minlength=ksub)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignments, x)
+                nonempty = counts > 0
+                centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+            self.codebooks[j] = centroids
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        dists = (centroids**2).sum(axis=1) - 2 * x @ centroids.T
+        return np.argmin(dists, axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        sub = vectors.reshape(len(vectors), self.m, self.dsub)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(sub[:, j], self.codebooks[j])
+        return codes
+
+    def append(self, vectors: np.ndarray) -> None:
+        if self.raw is not None:
+            self.raw.append(vectors)
+            self.size = self.raw.size
+            if self.size >= self.train_size:
+                self._quantize()
+            return
+        self._grow(len(vectors))
+        self.codes[self.size : self.size + len(vectors)] = self.encode(vectors)
+        self.size += len(vectors)
+
+    def _quantize(self) -> None:
+        vectors = self.raw.decode(slice(0, self.size))
+        rng = np.random.default_rng(self.seed)
+        self.train(vectors[rng.choice(self.size, self.train_size, replace=False)])
+        self.codes = np.zeros((self.raw.capacity, self.m), dtype=np.uint8)
+        for start in range(0, self.size, ExactIndex.CHUNK):
+            block = vectors[start : start + ExactIndex.CHUNK]
+            self.codes[start : start + len(block)] = self.encode(block)
+        self.raw = None
+
+    def keep(self, rows: np.ndarray) -> None:
+        if self.raw is not None:
+            self.raw.keep(rows)
+            self.size = self.raw.size
+            return
+        codes = np.zeros((max(2 * len(rows), self.MIN_CAPACITY), self.m), np.uint8)
+        codes[: len(rows)] = self.codes[rows]
+        self.codes, self.size = codes, len(rows)
+
+    def view(self):
+        view = copy.copy(self)
+        if self.raw is not None:
+            view.raw = self.raw.view()
+        return view
+
+    def decode(self, rows):
+        if self.raw is not None:
+            return self.raw.decode(rows)
+        codes = self.codes[rows]
+        return self.codebooks[np.arange(self.m), codes].reshape(len(codes), self.dim)
+
+    def score(self, queries, rows):
+        if self.raw is not None:
+            return self.raw.score(queries, rows)
+        codes = self.codes[rows]
+        tables = np.einsum(
+            "nmd,mkd->nmk",
+            queries.reshape(len(queries), self.m, self.dsub),
+            self.codebooks,
+        )
+        subspaces = np.arange(self.m)
+        return np.stack([table[subspaces, codes].sum(axis=1) for table in tables])
+
+
+STORAGES = {"float16": Float16Storage, "int8": Int8Storage, "pq": PQStorage}
+
+
+class VectorIndex(ABC):
+    """
+    Maps query vectors to the top-k rows of a ToolDB's vector storage.
+
+    The index never owns vectors: ToolDB passes its storage on every update and search.
+    Rows are stable until ToolDB compacts, after which reset() is called.
+    """
+
+    def update(self, storage: VectorStorage) -> None:
+        """Bring the index up to date with storage, called after writes and before searches."""
+        pass
+
+    def reset(self) -> None:
+        """Forget all rows, called when ToolDB renumbers them."""
+        pass
+
+    def view(self) -> "VectorIndex":
+        """
+        Read-only copy for a ToolDB snapshot, taken right after update(). Indexes replace
+        their arrays rather than modifying them in place, so a shallow copy suffices.
+        """
+        return copy.copy(self)
+
+    @abstractmethod
+    def search(
+        self,
+        storage: VectorStorage,
+        alive: Optional[np.ndarray],
+        queries: np.ndarray,
+        k: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param storage: Vector storage holding rows [0, storage.size).
+        :param alive: Boolean mask of live rows, None if there are no tombstones.
+        :param queries: Normalised float32 queries of shape (queries, dim).
+        :param k: Number of results per query, never more than the number of live rows.
+        :return: (rows, scores), both of shape (queries, k).
+        """
+        pass
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force inner product over all rows."""
+
+    # Rows decoded to float32 at a time, bounds the scratch memory per query.
+    CHUNK = 16384
+
+    def search(self, storage, alive, queries, k):
+        scores = np.empty((queries.shape[0], storage.size), dtype=np.float32)
+        for start in range(0, storage.size, self.CHUNK):
+            stop = min(start + self.CHUNK, storage.size)
+            scores[:, start:stop] = storage.score(queries, slice(start, stop))
+        if alive is not None:
+            scores[:, ~alive] = -np.inf
+        return top_k(scores, k)
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted file index: rows are clustered with spherical k-means and a query only
+    scores the rows of its nprobe closest clusters.
+
+    Rows added after training are assigned to the existing clusters; the index is
+    retrained once they outnumber the rows it was trained on.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        iterations: int = 10,
+        max_train: int = 65536,
+        seed: int = 0,
+    ):
+        """
+        :param nlist: Number of clusters, defaults to sqrt(rows).
+        :param nprobe: Number of clusters scanned per query.
+        :param iterations: k-means iterations.
+        :param max_train: Maximum number of rows sampled for training.
+        :param seed: Seed for sampling and initialisation.
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.max_train = max_train
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int64)
+        self.trained = 0
+        # CSR layout of the rows known at training time, per cluster.
+        self.order = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+
+    def _assign(self, storage: VectorStorage, start: int) -> np.ndarray:
+        assignments = np.empty(storage.size - start, dtype=np.int64)
+        for offset in range(start, storage.size, ExactIndex.CHUNK):
+            stop = min(offset + ExactIndex.CHUNK, storage.size)
+            scores = storage.score(self.centroids, slice(offset, stop))
+            assignments[offset - start : stop - start] = np.argmax(scores, axis=0)
+        return assignments
+
+    def train(self, storage: VectorStorage) -> None:
+        n = storage.size
+        nlist = max(1, min(self.nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(self.seed)
+        sample = storage.decode(np.sort(rng.choice(n, min(n, self.max_train), replace=False)))
+
+        centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)]
+        for _ in range(self.iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=nlist)
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[nonempty] = sums
+            # Re-seed empty clusters from random sample rows.
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample.shape[0], len(empty))]
+            centroids = normalize(centroids)
+
+        self.centroids = centroids
+        self.assignments = self._assign(storage, 0)
+        self.trained = n
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=nlist)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def update(self, storage: VectorStorage) -> None:
+        n = storage.size
+        if self.centroids is None or n - self.trained > self.trained:
+            if n:
+                self.train(storage)
+            return
+        known = self.assignments.shape[0]
+        if n > known:
+            self.assignments = np.concatenate(
+                [self.assignments, self._assign(storage, known)]
+            )
+
+    def search(self, storage, alive, queries, k):
+        self.update(storage)
+        nprobe = min(self.nprobe, self.centroids.shape[0])
+        probes, _ = top_k(queries @ self.centroids.T, nprobe)
+        tail = np.arange(self.trained, storage.size)
+
+        rows = np.empty((queries.shape[0], k), dtype=np.int64)
+        scores = np.empty((queries.shape[0], k), dtype=np.float32)
+        for i, (q, probe) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate(
+                [self.order[self.offsets[p] : self.offsets[p + 1]] for p in probe]
+                + [tail[np.isin(self.assignments[self.trained :], probe)]]
+            )
+            if alive is not None:
+                candidates = candidates[alive[candidates]]
+            if candidates.shape[0] < k:
+                # Too few rows in the probed clusters, fall back to a full scan.
+                found, found_scores = ExactIndex().search(storage, alive, q[None], k)
+                rows[i], scores[i] = found[0], found_scores[0]
+                continue
+            found, scores[i] = top_k(storage.score(q[None], candidates)[0], k)
+            rows[i] = candidates[found]
+        return rows, scores
+
+
+class AdaptiveK:
+    """
+    Picks the number of results from the score distribution instead of a fixed k.
+
+    Results are kept while they score at least min_score and are within gap of the
+    best score, relative to it, up to max_k and never fewer than min_k.
+    """
+
+    def __init__(
+        self,
+        min_score: Optional[float] = 0.3,
+        gap: Optional[float] = 0.15,
+        max_k: int = 5,
+        min_k: int = 1,
+    ):
+        """
+        :param min_score: Lowest cosine similarity a result can have, None disables the
+            check. With a lexical index, results keep their fused ranking but are
+            checked on their dense scores (see ToolDB.nearest_adaptive).
+        :param gap: Largest drop from the best score, as a fraction of it, None disables
+            the check.
+        :param max_k: Maximum number of results.
+        :param min_k: Minimum number of results, kept even if they fail the checks.
+        """
+        if not 1 <= min_k <= max_k:
+            raise ValueError("AdaptiveK requires 1 <= min_k <= max_k")
+        self.min_score = min_score
+        self.gap = gap
+        self.max_k = max_k
+        self.min_k = min_k
+
+    def select(self, scores: np.ndarray) -> int:
+        """
+        :param scores: Scores of the top results in ranking order, usually descending.
+        :return: Number of leading results to keep.
+        """
+        scores = np.asarray(scores, dtype=np.float32)[: self.max_k]
+        keep = np.ones(scores.shape[0], dtype=bool)
+        if self.min_score is not None:
+            keep &= scores >= self.min_score
+        if self.gap is not None and scores.shape[0]:
+            keep &= scores >= scores[0] - self.gap * abs(scores[0])
+        # Results are ranked, so the first failure ends the selection.
+        n = int(np.argmin(keep)) if not keep.all() else keep.shape[0]
+        return min(max(n, self.min_k), scores.shape[0])
+
+
+class Snapshot:
+    """
+    Immutable state of a ToolDB that searches run against.
+
+    Writers never touch a published snapshot; they build the next one and swap the
+    reference, so readers need no lock and never see partially written rows.
+    """
+
+    def __init__(
+        self,
+        storage: VectorStorage,
+        alive: Optional[np.ndarray],
+        ids: Tuple[Optional[str], ...],
+        items: Dict[str, Any],
+        index: VectorIndex,
+        rows: Dict[str, int],
+        lexical: Optional[BM25Index],
+        full: Optional[VectorStorage] = None,
+    ):
+        """
+        :param storage: View of the vector storage.
+        :param alive: Boolean mask of live rows, None if there are no tombstones.
+        :param ids: Row -> id, None for tombstones.
+        :param items: Id -> tool.
+        :param index: View of the index used for searches.
+        :param rows: Id -> row.
+        :param lexical: Copy of the BM25 index, if any.
+        :param full: View of the full width vectors used for rescoring, if any.
+        """
+        self.storage = storage
+        self.full = full
+        self.alive = alive
+        self.ids = ids
+        self.items = items
+        self.index = index
+        self.rows = rows
+        self.lexical = lexical
+
+    def __len__(self):
+        return len(self.items)
+
+
 class ToolDB:
-    def __init__(self, embedding: BaseEmbedding, max_size=1000):
+    # Compact once this fraction of rows are tombstones.
+    COMPACT_RATIO = 0.25
 
+    def __init__(
+        self,
+        embedding: BaseEmbedding,
+        capacity: int = VectorStorage.MIN_CAPACITY,
+        cache_dir: Optional[str] = None,
+        index: Optional[VectorIndex] = None,
+        ann_threshold: int = 20000,
+        storage: Union[str, VectorStorage] = "float16",
+        lexical: Optional[BM25Index] = None,
+        adaptive: Optional[AdaptiveK] = None,
+        embed_chunk_size: int = 256,
+        embed_workers: int = 4,
+        dim: Optional[int] = None,
+        rescore: int = 0,
+    ):
+        """
+        :param embedding: Embedding model used for tools and queries.
+        :param capacity: Initial number of rows, storage grows as needed.
+        :param cache_dir: Directory of the persistent schema embedding cache, None disables it.
+        :param index: Index used for every search. By default, brute force is used below
+            ann_threshold tools and an IVFIndex above it.
+        :param ann_threshold: Number of tools above which the default ANN index is used.
+        :param storage: Vector storage, one of "float16", "int8", "pq" or a VectorStorage.
+        :param lexical: BM25 index for hybrid retrieval, fused with dense results and able
+            to answer confident queries without embedding them.
+        :param adaptive: Result count selection used by nearest_adaptive().
+        :param embed_chunk_size: Maximum texts per embedding request when indexing.
+        :param embed_workers: Embedding requests in flight at once when indexing.
+        :param dim: Truncate tool and query embeddings to this many leading dimensions
+            and renormalise them. Only meaningful for Matryoshka models such as
+            snowflake-arctic-embed. Defaults to the full embedding width.
+        :param rescore: With dim set, rescore this many candidates per query with the
+            full width vectors, which are then kept as float16 next to the truncated
+            ones. 0 ranks by the truncated vectors only.
+        """
         self.embedding = embedding
-        self.vectors = np.full((max_size, self.embedding.dim), np.inf, dtype=np.float16)
-        self.count = 0
+        self.dim = dim or embedding.dim
+        if not 0 < self.dim <= embedding.dim:
+            raise ValueError(f"dim must be between 1 and {embedding.dim}")
+        if isinstance(storage, str):
+            if storage not in STORAGES:
+                raise ValueError(f"Unknown storage: {storage}")
+            storage = STORAGES[storage](self.dim)
+        if storage.dim != self.dim:
+            raise ValueError(f"Storage dim {storage.dim} does not match {self.dim}")
+        # Vectors are stored L2-normalised and compact; all scoring is done in
+        # float32 since float16 math is emulated on CPU.
+        self.storage = storage
+        self.storage.reserve(capacity)
+        self.alive = np.zeros(self.storage.capacity, dtype=bool)
+        self.deleted = 0
+        self.rescore = rescore if self.dim < embedding.dim else 0
+        self.full: Optional[VectorStorage] = None
+        if self.rescore:
+            self.full = Float16Storage(embedding.dim)
+            self.full.reserve(capacity)
+
+        self.ids: List[Optional[str]] = []  # row -> id, None for tombstones
+        self.rows: Dict[str, int] = {}  # id -> row
+        self.items: Dict[str, Any] = {}  # id -> tool
+        self.texts: Dict[str, str] = {}  # id -> embedded text
+
+        self.lexical = lexical
+        self.adaptive = adaptive or AdaptiveK()
+        self.embed_chunk_size = embed_chunk_size
+        self.embed_workers = embed_workers
+        self.index = index
+        self.ann_threshold = ann_threshold
+        self.exact = ExactIndex()
+        self.ann: Optional[VectorIndex] = None
+
+        # Writers mutate the fields above under the lock, then publish a new snapshot.
+        # Readers only ever dereference self.snapshot.
+        self._lock = threading.RLock()
+        self._writers = 0
+        self._compactor: Optional[threading.Thread] = None
+        self.cache = (
+            EmbeddingCache(embedding.cache_key, embedding.dim, cache_dir)
+            if cache_dir is not None
+            else None
+        )
+        self.snapshot: Snapshot
+        self._publish()
 
-    def add(self, texts: list[str]):
+    def __len__(self):
+        return len(self.snapshot)
+
+    def __contains__(self, id: str):
+        return id in self.snapshot.items
+
+    def get(self, id: str) -> Any:
+        """Return the tool stored under id."""
+        return self.snapshot.items[id]
+
+    def _publish(self) -> None:
+        """Swap in a snapshot of the current state. Called with the lock held."""
+        index = self._select_index()
+        index.update(self.storage)
+        self.snapshot = Snapshot(
+            storage=self.storage.view(),
+            alive=self.alive[: self.count].copy() if self.deleted else None,
+            ids=tuple(self.ids),
+            items=dict(self.items),
+            index=index.view(),
+            rows=dict(self.rows),
+            lexical=self.lexical.copy() if self.lexical is not None else None,
+            full=self.full.view() if self.full is not None else None,
+        )
+
+    @contextmanager
+    def _write(self):
+        """
+        Serialise writers and publish once the outermost write finishes, so compound
+        operations like sync() appear to readers as a single change.
+        """
+        with self._lock:
+            self._writers += 1
+            try:
+                yield
+            finally:
+                self._writers -= 1
+            if self._writers == 0:
+                self._publish()
+
+    def _embed(self, texts: List[str]) -> Tuple[List[int], np.ndarray]:
+        """
+        Embed texts in concurrent chunks, skipping the ones the model rejects.
+
+        :return: (positions of embedded texts, normalised embeddings)
+        """
+        if len(texts) == 0:
+            return [], np.empty((0, self.embedding.dim), dtype=np.float32)
+
+        size = max(1, self.embed_chunk_size)
+        starts = range(0, len(texts), size)
+        chunks = [texts[start : start + size] for start in starts]
+        if len(chunks) > 1 and self.embed_workers > 1:
+            with ThreadPoolExecutor(min(self.embed_workers, len(chunks))) as pool:
+                results = list(pool.map(self._embed_chunk, chunks))
+        else:
+            results = [self._embed_chunk(chunk) for chunk in chunks]
+
+        kept, embeddings = [], []
+        for start, (positions, vectors) in zip(starts, results):
+            kept.extend(start + p for p in positions)
+            embeddings.extend(vectors)
+        if len(kept) == 0:
+            return kept, np.empty((0, self.embedding.dim), dtype=np.float32)
+        return kept, normalize(np.asarray(embeddings).reshape(len(kept), -1))
+
+    def _embed_chunk(self, texts: List[str]) -> Tuple[List[int], List[np.ndarray]]:
+        """
+        Embed texts in one request. If the model rejects the request, bisect it to
+        isolate the offending texts, which are then split and mean-pooled.
+
+        :return: (positions of embedded texts, their embeddings)
+        """
         try:
-            embeddings = self.embedding.batch_embed(texts)
-        except ResponseError:
-            embeddings = []
-            for t in texts:
-                try:
-                    embeddings.append(self.embedding.embed(t))
-                except ResponseError:
-                    logger.info(
-                        f"Doc string is too long for function {t.split()[1].split('(')[0]}"
-                    )
+            vectors = np.asarray(self.embedding.batch_embed(texts), dtype=np.float32)
+        except ResponseError as e:
+            if e.status_code == 404:
+                # Unknown model: every request would fail the same way.
+                raise
+            if len(texts) > 1:
+                mid = len(texts) // 2
+                left, left_vectors = self._embed_chunk(texts[:mid])
+                right, right_vectors = self._embed_chunk(texts[mid:])
+                return left + [mid + p for p in right], left_vectors + right_vectors
+
+            vector = self._embed_split(texts[0])
+            return ([0], [vector]) if vector is not None else ([], [])
+        vectors = np.atleast_2d(vectors)
+        if len(vectors) != len(texts):
+            raise ValueError(
+                f"{type(self.embedding).__name__}.batch_embed returned {len(vectors)} "
+                f"embeddings for {len(texts)} texts"
+            )
+        return list(range(len(texts))), list(vectors)
+
+    def _embed_split(self, text: str) -> Optional[np.ndarray]:
+        """Embed a text too long for the model as the length-weighted mean of its pieces."""
+        pieces = split_text(text)
+        if pieces is None:
+            logger.info(f"Doc string is too long for function {_tool_name(text)}")
+            return None
+        vectors, weights = [], []
+        for piece in pieces:
+            positions, embedded = self._embed_chunk([piece])
+            if positions:
+                vectors.append(normalize(embedded[0][None])[0])
+                weights.append(len(piece))
+        if not vectors:
+            return None
+        return np.average(vectors, axis=0, weights=weights)
+
+    def _embed_cached(self, texts: List[str]) -> Tuple[List[int], np.ndarray]:
+        """Like _embed, but serves and fills the persistent cache."""
+        if self.cache is None:
+            return self._embed(texts)
+
+        hits, cached, misses = self.cache.get(texts)
+        kept, fresh = self._embed([texts[i] for i in misses])
+        self.cache.put([texts[misses[i]] for i in kept], fresh)
+        if hits:
+            logger.info(f"Loaded {len(hits)} tool embeddings from cache")
+
+        # Keep the original order. Hits are converted to float32 straight into their
+        # output rows, the only copy made of the mapped vectors.
+        positions = np.array(hits + [misses[i] for i in kept], dtype=np.int64)
+        order = np.argsort(positions, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        embeddings = np.empty((len(positions), self.embedding.dim), dtype=np.float32)
+        embeddings[rank[: len(hits)]] = cached
+        embeddings[rank[len(hits) :]] = fresh
+        return positions[order].tolist(), embeddings
+
+    @property
+    def count(self) -> int:
+        """Rows in use, including tombstones."""
+        return self.storage.size
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by vectors and row bookkeeping arrays."""
+        full = self.full.nbytes if self.full is not None else 0
+        return self.storage.nbytes + full + self.alive.nbytes
+
+    def _reserve(self, n: int) -> None:
+        """Grow storage geometrically so that n more rows fit."""
+        capacity = self.storage.capacity
+        if self.count + n > capacity:
+            self.storage.reserve(max(2 * capacity, self.count + n))
+        if self.full is not None and self.storage.capacity > self.full.capacity:
+            self.full.reserve(self.storage.capacity)
+        if self.storage.capacity > self.alive.shape[0]:
+            alive = np.zeros(self.storage.capacity, dtype=bool)
+            alive[: self.count] = self.alive[: self.count]
+            self.alive = alive
+
+    def _tombstone(self, id: str) -> None:
+        row = self.rows.pop(id)
+        self.alive[row] = False
+        self.ids[row] = None
+        self.items.pop(id, None)
+        self.texts.pop(id, None)
+        if self.lexical is not None:
+            self.lexical.remove(id)
+        self.deleted += 1
+
+    def add(
+        self,
+        texts: List[str],
+        ids: Optional[List[str]] = None,
+        items: Optional[List[Any]] = None,
+    ) -> None:
+        """
+        Insert or replace entries. Entries whose id and text are unchanged are not re-embedded.
+
+        :param texts: Texts to embed.
+        :param ids: Stable ids of the entries, defaults to the texts.
+        :param items: Objects returned by get(id), defaults to the texts.
+        """
+        ids = list(texts) if ids is None else list(ids)
+        items = list(texts) if items is None else list(items)
+
+        with self._write():
+            pending = {}
+            for id, text, item in zip(ids, texts, items):
+                if self.texts.get(id) == text:
+                    self.items[id] = item
                     continue
+                pending[id] = (text, item)
+            if not pending:
+                return
+
+            kept, embeddings = self._embed_cached([t for t, _ in pending.values()])
+            pending = list(pending.items())
+            self._reserve(len(kept))
+            start = self.count
+            for row, i in enumerate(kept, start):
+                id, (text, item) = pending[i]
+                if id in self.rows:
+                    self._tombstone(id)
+                self.ids.append(id)
+                self.rows[id] = row
+                self.items[id] = item
+                self.texts[id] = text
+                if self.lexical is not None:
+                    self.lexical.add(id, text, name=getattr(item, "name", None))
+            self.storage.append(truncate(embeddings, self.dim))
+            if self.full is not None:
+                self.full.append(embeddings)
+            self.alive[start : self.count] = True
+            self._maybe_compact()
+
+    def upsert(self, tools: List[Any]) -> None:
+        """Insert or replace tools, keyed by tool name."""
+        self.add([str(t) for t in tools], ids=[t.name for t in tools], items=tools)
+
+    def remove(self, ids: List[str]) -> None:
+        """Remove entries by id, unknown ids are ignored."""
+        with self._write():
+            for id in ids:
+                if id in self.rows:
+                    self._tombstone(id)
+            self._maybe_compact()
+
+    def sync(
+        self, tools: List[Any], background: bool = False
+    ) -> Optional[threading.Thread]:
+        """
+        Make the index contain exactly the given tools. Searches keep using the previous
+        tool set until the new one is published.
+
+        :param tools: The new tool set.
+        :param background: If True, embed and index on a daemon thread and return it.
+        """
+        if background:
+            thread = threading.Thread(target=self.sync, args=(tools,), daemon=True)
+            thread.start()
+            return thread
+
+        names = {t.name for t in tools}
+        with self._write():
+            self.remove([id for id in self.rows if id not in names])
+            self.upsert(tools)
+        return None
+
+    def _maybe_compact(self) -> None:
+        if self.deleted <= self.COMPACT_RATIO * self.count:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def compact(self) -> None:
+        """Drop tombstoned rows and shrink storage."""
+        with self._write():
+            if self.deleted == 0:
+                return
+            live = np.flatnonzero(self.alive[: self.count])
+            self.storage.keep(live)
+            if self.full is not None:
+                self.full.keep(live)
+            self.alive = np.zeros(self.storage.capacity, dtype=bool)
+            self.alive[: len(live)] = True
+
+            self.ids = [self.ids[r] for r in live]
+            self.rows = {id: row for row, id in enumerate(self.ids)}
+            self.deleted = 0
+
+            for index in (self.index, self.ann):
+                if index is not None:
+                    index.reset()
+
+    def _select_index(self) -> VectorIndex:
+        if self.index is not None:
+            return self.index
+        if len(self.rows) < self.ann_threshold:
+            return self.exact
+        if self.ann is None:
+            logger.info(f"Using IVF index for {len(self.rows)} tools")
+            self.ann = IVFIndex()
+        return self.ann
+
+    def set_nprobe(self, nprobe: int) -> None:
+        """
+        Set the number of clusters the IVF index scans per query. Searches read a copy
+        of the index from the published snapshot, so the live index must not be changed
+        directly.
+
+        :param nprobe: Clusters scanned per query.
+        """
+        if nprobe < 1:
+            raise ValueError("nprobe must be at least 1")
+        with self._write():
+            index = self._select_index()
+            if not isinstance(index, IVFIndex):
+                raise ValueError("ToolDB is not using an IVF index")
+            index.nprobe = nprobe
+
+    def search_batch(
+        self, query_vectors: np.ndarray, k=1, index: Optional[VectorIndex] = None
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Cosine top-k search for several embedded queries.
+
+        :param query_vectors: Query embeddings of shape (queries, dim).
+        :param k: Number of results per query.
+        :param index: Index to search with instead of the configured one, e.g. ToolDB.exact
+            to measure recall of the ANN index.
+        :return: (ids per query, scores of shape (queries, k)) ordered by descending similarity.
+        """
+        return self._search(self.snapshot, query_vectors, k, index)
+
+    def _search(
+        self,
+        snapshot: Snapshot,
+        query_vectors: np.ndarray,
+        k: int,
+        index: Optional[VectorIndex] = None,
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        full = normalize(np.asarray(query_vectors).reshape(-1, self.embedding.dim))
+        q = truncate(full, self.dim)
+        k = min(k, len(snapshot))
+        if k <= 0:
+            return [[] for _ in q], np.empty((q.shape[0], 0), dtype=np.float32)
+        index = index or snapshot.index
+        if snapshot.full is None:
+            rows, scores = index.search(snapshot.storage, snapshot.alive, q, k)
+        else:
+            # Two-stage search: coarse candidates on truncated vectors, then exact
+            # ranking of the candidates with the full width ones.
+            candidates, _ = index.search(
+                snapshot.storage,
+                snapshot.alive,
+                q,
+                min(max(k, self.rescore), len(snapshot)),
+            )
+            rows = np.empty((q.shape[0], k), dtype=np.int64)
+            scores = np.empty((q.shape[0], k), dtype=np.float32)
+            for i, row in enumerate(candidates):
+                found, scores[i] = top_k(snapshot.full.score(full[i : i + 1], row)[0], k)
+                rows[i] = row[found]
+        return [[snapshot.ids[r] for r in row] for row in rows], scores
+
+    def search(self, query_vector: np.ndarray, k=1) -> Tuple[List[str], np.ndarray]:
+        """
+        Cosine top-k search for an already embedded query.
+
+        :param query_vector: Query embedding of shape (dim,) or (1, dim).
+        :param k: Number of results to return.
+        :return: (ids, scores) ordered by descending cosine similarity.
+        """
+        ids, scores = self.search_batch(np.asarray(query_vector).reshape(1, -1), k=k)
+        return ids[0], scores[0]
+
+    def _lexical_first(
+        self, snapshot: Snapshot, queries: List[str], k: int
+    ) -> Tuple[List[Optional[List[Tuple[str, float]]]], List[List[Tuple[str, float]]]]:
+        """
+        Run the lexical side of retrieval.
+
+        :return: (final results, None where dense retrieval is still needed; lexical hits)
+        """
+        bm25 = snapshot.lexical
+        results: List[Optional[List[Tuple[str, float]]]] = [None] * len(queries)
+        lexical = [[] for _ in queries]
+        if bm25 is not None:
+            for i, query in enumerate(queries):
+                lexical[i] = bm25.search(query, max(k, bm25.candidates))
+                if bm25.confident(query, lexical[i], k):
+                    results[i] = lexical[i][:k]
+        return results, lexical
+
+    def _merge(
+        self,
+        snapshot: Snapshot,
+        k: int,
+        results: List[Optional[List[Tuple[str, float]]]],
+        lexical: List[List[Tuple[str, float]]],
+        pending: List[int],
+        query_vectors: Optional[np.ndarray],
+    ) -> Tuple[List, np.ndarray]:
+        """Search the embedded pending queries and fuse them with their lexical hits."""
+        bm25 = snapshot.lexical
+        if pending:
+            dense_k = k if bm25 is None else max(k, bm25.candidates)
+            ids, scores = self._search(snapshot, query_vectors, k=dense_k)
+            for i, row_ids, row_scores in zip(pending, ids, scores):
+                dense = list(zip(row_ids, row_scores.tolist()))
+                if lexical[i]:
+                    results[i] = bm25.fuse(dense, lexical[i], k)
+                else:
+                    results[i] = dense[:k]
+
+        ids = [[id for id, _ in r] for r in results]
+        scores = np.array([[s for _, s in r] for r in results], dtype=np.float32)
+        return ids, scores.reshape(len(results), -1)
+
+    def _nearest(
+        self, queries: List[str], k: int, embed, snapshot: Optional[Snapshot] = None
+    ) -> Tuple[List, np.ndarray]:
+        """
+        Shared retrieval for nearest() and nearest_batch().
+
+        :param embed: Callable embedding a list of query texts into (queries, dim).
+        """
+        snapshot = snapshot or self.snapshot
+        results, lexical = self._lexical_first(snapshot, queries, k)
+        pending = [i for i, r in enumerate(results) if r is None]
+        vectors = embed([queries[i] for i in pending]) if pending else None
+        return self._merge(snapshot, k, results, lexical, pending, vectors)
+
+    async def _async_nearest(
+        self, queries: List[str], k: int, embed, snapshot: Optional[Snapshot] = None
+    ) -> Tuple[List, np.ndarray]:
+        """Like _nearest, with embed a coroutine function."""
+        snapshot = snapshot or self.snapshot
+        results, lexical = self._lexical_first(snapshot, queries, k)
+        pending = [i for i, r in enumerate(results) if r is None]
+        vectors = await embed([queries[i] for i in pending]) if pending else None
+        return self._merge(snapshot, k, results, lexical, pending, vectors)
+
+    def nearest(self, query, k=1, return_scores=False, snapshot=None):
+        """
+        Find the k tools closest to a query string.
+
+        :param query: Query text.
+        :param k: Number of results to return.
+        :param return_scores: If True, also return the score of each result: cosine
+            similarity, or the fused/BM25 score when a lexical index is configured.
+        :param snapshot: Snapshot to search, defaults to the current one. Pass
+            db.snapshot and resolve ids with snapshot.items to stay consistent with
+            concurrent writes.
+        :return: Ids of the nearest tools, or (ids, scores) if return_scores is set.
+        """
+        ids, scores = self._nearest(
+            [query], k, lambda texts: self.embedding.embed_query(texts[0]), snapshot
+        )
+        if return_scores:
+            return ids[0], scores[0]
+        return ids[0]
+
+    async def async_nearest(self, query, k=1, return_scores=False, snapshot=None):
+        """Like nearest(), embedding the query without blocking the event loop."""
+
+        async def embed(texts):
+            return await self.embedding.async_embed_query(texts[0])
+
+        ids, scores = await self._async_nearest([query], k, embed, snapshot)
+        if return_scores:
+            return ids[0], scores[0]
+        return ids[0]
+
+    def _selection_scores(
+        self,
+        snapshot: Snapshot,
+        ids: List[str],
+        scores: np.ndarray,
+        query_vector: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """
+        Scores AdaptiveK selects on, aligned with ids. Fused scores are rank based
+        (reciprocal rank fusion stays below 2 / (rrf_k + 1)), so with a lexical index
+        the results are checked on their cosine similarity to the query instead.
+        Results answered by BM25 alone have no query vector and are checked on their
+        score relative to the best one.
+        """
+        if snapshot.lexical is None or len(ids) == 0:
+            return scores
+        if query_vector is None:
+            return scores / scores[0] if scores[0] > 0 else scores
+        rows = np.array([snapshot.rows[id] for id in ids], dtype=np.int64)
+        full = normalize(np.asarray(query_vector).reshape(1, self.embedding.dim))
+        if snapshot.full is not None:
+            return snapshot.full.score(full, rows)[0]
+        return snapshot.storage.score(truncate(full, self.dim), rows)[0]
+
+    def _adaptive(
+        self,
+        snapshot: Snapshot,
+        results: List[Optional[List[Tuple[str, float]]]],
+        lexical: List[List[Tuple[str, float]]],
+        query_vector: Optional[np.ndarray],
+        return_scores: bool,
+    ):
+        """Shared end of nearest_adaptive() and async_nearest_adaptive()."""
+        pending = [0] if query_vector is not None else []
+        ids, scores = self._merge(
+            snapshot, self.adaptive.max_k, results, lexical, pending, query_vector
+        )
+        ids, scores = ids[0], scores[0]
+        n = self.adaptive.select(
+            self._selection_scores(snapshot, ids, scores, query_vector)
+        )
+        if return_scores:
+            return ids[:n], scores[:n]
+        return ids[:n]
+
+    def nearest_adaptive(self, query, return_scores=False, snapshot=None):
+        """
+        Find the tools closest to a query string, keeping as many as the score
+        distribution supports (see AdaptiveK).
+
+        :param query: Query text.
+        :param return_scores: If True, also return the score of each result, as
+            returned by nearest().
+        :param snapshot: Snapshot to search, defaults to the current one.
+        :return: Ids of the nearest tools, or (ids, scores) if return_scores is set.
+        """
+        snapshot = snapshot or self.snapshot
+        results, lexical = self._lexical_first(snapshot, [query], self.adaptive.max_k)
+        vector = self.embedding.embed_query(query) if results[0] is None else None
+        return self._adaptive(snapshot, results, lexical, vector, return_scores)
+
+    async def async_nearest_adaptive(self, query, return_scores=False, snapshot=None):
+        """Like nearest_adaptive(), embedding the query without blocking the event loop."""
+        snapshot = snapshot or self.snapshot
+        results, lexical = self._lexical_first(snapshot, [query], self.adaptive.max_k)
+        vector = None
+        if results[0] is None:
+            vector = await self.embedding.async_embed_query(query)
+        return self._adaptive(snapshot, results, lexical, vector, return_scores)
+
+    def nearest_batch(
+        self, queries: List[str], k=1, snapshot: Optional[Snapshot] = None
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """
+        Find the k closest tools for each query, embedding all queries in one call.
 
-        for t, e in zip(texts, embeddings):
-            self.vectors[self.count] = e
-            self.count += 1
+        :param queries: Query texts.
+        :param k: Number of results per query.
+        :param snapshot: Snapshot to search, defaults to the current one.
+        :return: (ids per query, scores of shape (queries, k)).
+        """
+        if len(queries) == 0:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return self._nearest(
+            list(queries), k, self.embedding.batch_embed_query, snapshot
+        )
 
-    def nearest(self, query, k=1):
-        q = self.embedding.embed_query(query)
-        q = np.array(q, dtype=self.vectors.dtype)
-        dists = np.linalg.norm(self.vectors[: self.count] - q, axis=1)
-        return np.argsort(dists)[:k]
+    async def async_nearest_batch(
+        self, queries: List[str], k=1, snapshot: Optional[Snapshot] = None
+    ) -> Tuple[List[List[str]], np.ndarray]:
+        """Like nearest_batch(), embedding the queries without blocking the event loop."""
+        if len(queries) == 0:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return await self._async_nearest(
+            list(queries), k, self.embedding.async_batch_embed_query, snapshot
+        )
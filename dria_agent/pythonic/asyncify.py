@@ -0,0 +1,103 @@
+"""
+Rewriting of generated code for async execution.
+
+Inside the coroutine that async_execute_python_code wraps the code in, every tool call
+site that can await is rewritten:
+
+    result = fetch(url)       ->  result = await fetch(url)                 # coroutine tool
+    value = compute(result)   ->  value = await __offload__(compute, result)  # sync tool
+
+Sync tools run on a bounded thread pool, so a blocking tool no longer stalls every
+other task on the event loop. Calls inside nested functions, lambdas and generator
+expressions cannot await and are left as they are.
+"""
+
+import ast
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, FrozenSet, Optional
+
+OFFLOAD = "__offload__"
+
+# Threads shared by all async executions for running sync tools.
+MAX_WORKERS = 32
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(MAX_WORKERS, thread_name_prefix="tool")
+    return _executor
+
+
+async def offload(func: Callable, /, *args, **kwargs) -> Any:
+    """
+    Run a sync tool on the tool thread pool, in a copy of the caller's context.
+
+    func is positional-only, so tools with a keyword argument named func still work.
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+
+class AwaitTools(ast.NodeTransformer):
+    """Await coroutine tool calls and offload sync tool calls."""
+
+    def __init__(self, tools: FrozenSet[str], coroutines: FrozenSet[str]):
+        """
+        Args:
+            tools: Names of sync tools.
+            coroutines: Names of coroutine tools.
+        """
+        self.tools = tools
+        self.coroutines = coroutines
+
+    def _awaitable(self, node: ast.Call) -> Optional[ast.Call]:
+        if not isinstance(node.func, ast.Name):
+            return None
+        if node.func.id in self.coroutines:
+            return node
+        if node.func.id in self.tools:
+            offloaded = ast.Call(
+                ast.Name(OFFLOAD, ast.Load()), [node.func] + node.args, node.keywords
+            )
+            return ast.copy_location(offloaded, node)
+        return None
+
+    def visit_Call(self, node: ast.Call) -> ast.AST:
+        self.generic_visit(node)
+        awaitable = self._awaitable(node)
+        if awaitable is None:
+            return node
+        return ast.copy_location(ast.Await(awaitable), node)
+
+    def visit_Await(self, node: ast.Await) -> ast.AST:
+        # Calls the model already awaited are kept awaited once.
+        if isinstance(node.value, ast.Call):
+            self.generic_visit(node.value)
+            awaitable = self._awaitable(node.value)
+            if awaitable is not None:
+                node.value = awaitable
+            return node
+        self.generic_visit(node)
+        return node
+
+    def _skip(self, node: ast.AST) -> ast.AST:
+        # Sync scopes: an await here would be a syntax error.
+        return node
+
+    visit_FunctionDef = _skip
+    visit_Lambda = _skip
+    visit_ClassDef = _skip
+    visit_GeneratorExp = _skip
+
+
+HELPERS = {OFFLOAD: offload}
@@ -1,16 +1,173 @@
+import ast
 import asyncio
-from typing import Dict, Any, List, Callable
+import builtins
+import hashlib
+import inspect
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextvars import ContextVar, copy_context
+from types import CodeType, coroutine
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Any,
+    List,
+    Callable,
+    FrozenSet,
+    Optional,
+    Tuple,
+    Union,
+)
 
+from dria_agent.agent.tool import ToolCall
+from . import asyncify, parallel as parallel_calls
 from .schemas import FunctionResults, ExecutionResults
 from .util import (
     extract_codeblocks,
     setup_logger,
 )
 
+if TYPE_CHECKING:
+    from .sandbox import ProcessSandbox
+
 # Set up logger using the utility function
 logger = setup_logger(__name__)
 
 
+# Filename of generated code, which tells its frames apart from those of the tools.
+GENERATED = "<generated>"
+
+
+def _wrap_async(code: str) -> str:
+    """Wrap code in a coroutine function returning its locals, so it can await tools."""
+    async_code = "async def __async_exec():\n"
+    async_code += "".join(f"    {line}\n" for line in code.splitlines())
+    async_code += "\n    return locals()"
+    return async_code
+
+
+class CodeCache:
+    """
+    Thread-safe LRU of compiled code objects, keyed by source hash, wrapping mode and
+    the tool names the code is rewritten for.
+
+    Feedback retries and templated batch completions execute the same source many
+    times; caching skips recompiling it (and rebuilding the async wrapper) each time.
+    """
+
+    MODES = {"sync": lambda code: code, "async": _wrap_async}
+
+    def __init__(self, maxsize: int = 256, max_bytes: int = 4 * 1024 * 1024):
+        """
+        Args:
+            maxsize: Maximum number of compiled entries, 0 disables caching.
+            max_bytes: Maximum total length of the cached sources.
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (code, nbytes)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(
+        self,
+        code: str,
+        mode: str = "sync",
+        tools: FrozenSet[str] = frozenset(),
+        coroutines: FrozenSet[str] = frozenset(),
+        parallel: FrozenSet[str] = frozenset(),
+    ) -> CodeType:
+        """
+        Return the compiled code object for code, compiling it on a miss.
+
+        Args:
+            code: Python source to execute.
+            mode: "sync" compiles code as is, "async" wrapped in a coroutine function
+                that awaits coroutine tools and offloads sync tools to threads.
+            tools: Names of the sync tools.
+            coroutines: Names of the coroutine tools.
+            parallel: Names of the tools whose independent calls may run concurrently.
+
+        Raises:
+            SyntaxError: If the source does not compile. Failures are not cached.
+        """
+        source = code.encode("utf-8")
+        key = (hashlib.sha256(source).hexdigest(), mode, tools, coroutines, parallel)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        compiled = compile(
+            self._build(code, mode, tools, coroutines, parallel), GENERATED, "exec"
+        )
+        if self.maxsize <= 0 or len(source) > self.max_bytes:
+            return compiled
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (compiled, len(source))
+                self.nbytes += len(source)
+            while len(self._entries) > self.maxsize or self.nbytes > self.max_bytes:
+                _, (_, nbytes) = self._entries.popitem(last=False)
+                self.nbytes -= nbytes
+                self.evictions += 1
+        return compiled
+
+    def _build(
+        self,
+        code: str,
+        mode: str,
+        tools: FrozenSet[str],
+        coroutines: FrozenSet[str],
+        parallel: FrozenSet[str],
+    ) -> Union[str, ast.Module]:
+        source = self.MODES[mode](code)
+        if mode == "sync" and not parallel:
+            return source
+        tree = ast.parse(source, GENERATED)
+        owner = tree
+        if mode == "async":
+            owner = tree.body[0]
+            rewriter = asyncify.AwaitTools(tools, coroutines)
+            owner.body = [rewriter.visit(stmt) for stmt in owner.body]
+        if parallel:
+            owner.body = parallel_calls.parallelize(
+                owner.body, tools & parallel, coroutines & parallel
+            )
+        return ast.fix_missing_locations(tree)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "bytes": self.nbytes,
+        }
+
+
+code_cache = CodeCache()
+
+
 def _create_execution_env(safe: bool = False) -> Dict[str, Any]:
     """Create and return a sandboxed execution environment if safe=True."""
     dangerous_builtins = [
@@ -28,7 +185,7 @@ def _create_execution_env(safe: bool = False) -> Dict[str, Any]:
     if safe:
         env["__builtins__"] = {
             k: v
-            for k, v in __builtins__.__dict__.items()
+            for k, v in vars(builtins).items()
             if k not in dangerous_builtins
         }
 
@@ -42,60 +199,339 @@ def _setup_env_imports(env: Dict[str, Any]) -> None:
     exec("from datetime import datetime, timedelta", env)
 
 
-def _make_sync_wrapper(
-    func_name: str, func: Callable, call_results: Dict, errors: List
-) -> Callable:
+class ToolTimeoutError(TimeoutError):
+    """A tool call ran past its own timeout or the execution's time budget."""
+
+
+def unwrap_tool(tool: Callable) -> Tuple[str, Callable, Optional[float], bool]:
+    """
+    Name, function, timeout and parallel safety of a tool.
+
+    Args:
+        tool: A ToolCall, or a plain function, optionally with timeout and
+            parallel_safe attributes.
+    """
+    if isinstance(tool, ToolCall):
+        return tool.name, tool.func, tool.timeout, tool.parallel_safe
+    return (
+        tool.__name__,
+        tool,
+        getattr(tool, "timeout", None),
+        getattr(tool, "parallel_safe", False),
+    )
+
+
+class _CallContext:
+    """Per-execution state the shared tool wrappers record into."""
+
+    __slots__ = ("functions", "call_results", "errors", "budget", "deadline")
+
+    def __init__(self, functions: Dict[str, Callable], budget: Optional[float] = None):
+        self.functions = functions
+        self.call_results: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self.budget = budget
+        self.deadline = time.monotonic() + budget if budget is not None else None
+
+    def limit(self, func_name: str, timeout: Optional[float]) -> Optional[float]:
+        """Seconds the next call of func_name may run: its timeout, cut to the budget left."""
+        if self.deadline is None:
+            return timeout
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise ToolTimeoutError(
+                f"Execution time budget of {self.budget}s exhausted before calling {func_name}"
+            )
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+# Wrappers live in shared environment templates, so they find the execution they
+# belong to through a context variable (per thread, and per task under asyncio).
+_call_context: ContextVar[_CallContext] = ContextVar("dria_agent_call_context")
+
+
+def _timed_out(func_name: str, start: float) -> ToolTimeoutError:
+    return ToolTimeoutError(
+        f"{func_name} timed out after {time.monotonic() - start:.2f}s"
+    )
+
+
+def _no_time_left(func_name: str) -> ToolTimeoutError:
+    return ToolTimeoutError(f"No time left to call {func_name}")
+
+
+def _deadline_trace(context: _CallContext) -> Optional[Callable]:
+    """
+    Trace function interrupting generated code that runs past the execution's budget.
+
+    Only frames of the generated code are traced, instruction by instruction since
+    a loop such as "while True: pass" has no line events, so tools run at full speed.
+    Code blocked inside a call, such as time.sleep, is interrupted once the call
+    returns. None if there is no budget, or a debugger or profiler already traces.
+    """
+    if context.deadline is None or sys.gettrace() is not None:
+        return None
+    deadline, budget = context.deadline, context.budget
+
+    def trace_opcodes(frame, event, arg):
+        if event == "opcode" and time.monotonic() > deadline:
+            raise TimeoutError(f"Execution timed out after {budget}s")
+        return trace_opcodes
+
+    def trace(frame, event, arg):
+        if frame.f_code.co_filename != GENERATED:
+            return None
+        frame.f_trace_lines = False
+        frame.f_trace_opcodes = True
+        return trace_opcodes
+
+    return trace
+
+
+@coroutine
+def _trace_steps(coro, trace: Callable):
+    send, value = coro.send, None
+    while True:
+        sys.settrace(trace)
+        try:
+            yielded = send(value)
+        except StopIteration as e:
+            return e.value
+        finally:
+            sys.settrace(None)
+        try:
+            value, send = (yield yielded), coro.send
+        except BaseException as e:
+            value, send = e, coro.throw
+
+
+async def _traced(coro, trace: Callable) -> Any:
+    """Await coro with trace set on the thread only while coro runs."""
+    return await _trace_steps(coro, trace)
+
+
+def call_with_timeout(
+    func_name: str, func: Callable, args, kwargs, timeout: Optional[float]
+) -> Any:
+    """
+    Call a sync function, giving up after timeout seconds.
+
+    Python threads cannot be interrupted, so a call that times out is abandoned: it
+    keeps running on a daemon thread and its result is discarded.
+
+    Raises:
+        ToolTimeoutError: If the call did not return in time, or timeout is not
+            positive, in which case the call is not started.
+    """
+    if timeout is None:
+        return func(*args, **kwargs)
+    if timeout <= 0:
+        raise _no_time_left(func_name)
+    start = time.monotonic()
+    outcome = {}
+    done = threading.Event()
+
+    def run():
+        try:
+            outcome["result"] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            done.set()
+
+    context = copy_context()
+    threading.Thread(target=context.run, args=(run,), daemon=True).start()
+    if not done.wait(timeout):
+        raise _timed_out(func_name, start)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+async def async_call_with_timeout(
+    func_name: str, func: Callable, args, kwargs, timeout: Optional[float]
+) -> Any:
+    """
+    Await a coroutine function, cancelling it after timeout seconds.
+
+    Raises:
+        ToolTimeoutError: If the call did not return in time, or timeout is not
+            positive, in which case the call is not started.
+    """
+    if timeout is None:
+        return await func(*args, **kwargs)
+    if timeout <= 0:
+        raise _no_time_left(func_name)
+    start = time.monotonic()
+    try:
+        return await asyncio.wait_for(func(*args, **kwargs), timeout)
+    except asyncio.TimeoutError:
+        raise _timed_out(func_name, start) from None
+
+
+def _make_sync_wrapper(func_name: str, timeout: Optional[float]) -> Callable:
     """Create a synchronous wrapper function that captures return values."""
 
     def wrapper(*args, **kwargs):
+        context = _call_context.get()
         try:
-            result = func(*args, **kwargs)
-            call_results.setdefault(func_name, []).append(result)
+            limit = context.limit(func_name, timeout)
+            func = context.functions[func_name]
+            result = call_with_timeout(func_name, func, args, kwargs, limit)
+            context.call_results.setdefault(func_name, []).append(result)
             return result
         except Exception as e:
-            errors.append(f"Error in {func_name}: {str(e)}")
+            context.errors.append(f"Error in {func_name}: {str(e)}")
             raise
 
     return wrapper
 
 
-async def _make_async_wrapper(
-    func_name: str, func: Callable, call_results: Dict, errors: List
+def _make_async_wrapper(
+    func_name: str, timeout: Optional[float], coroutine: bool
 ) -> Callable:
     """Create an async wrapper function that captures return values."""
-    if asyncio.iscoroutinefunction(func):
+    if coroutine:
 
         async def wrapper(*args, **kwargs):
+            context = _call_context.get()
             try:
-                result = await func(*args, **kwargs)
-                call_results.setdefault(func_name, []).append(result)
+                limit = context.limit(func_name, timeout)
+                func = context.functions[func_name]
+                result = await async_call_with_timeout(
+                    func_name, func, args, kwargs, limit
+                )
+                context.call_results.setdefault(func_name, []).append(result)
                 return result
             except Exception as e:
-                errors.append(f"Error in {func_name}: {str(e)}")
+                context.errors.append(f"Error in {func_name}: {str(e)}")
                 raise
 
-    else:
+        return wrapper
 
-        def wrapper(*args, **kwargs):
-            try:
-                result = func(*args, **kwargs)
-                call_results.setdefault(func_name, []).append(result)
-                return result
-            except Exception as e:
-                errors.append(f"Error in {func_name}: {str(e)}")
-                raise
+    return _make_sync_wrapper(func_name, timeout)
 
-    return wrapper
+
+class _EnvTemplate:
+    """
+    Execution environment prepared once per (tool set, safe, mode): filtered builtins,
+    common imports and tool wrappers. Each execution runs in a shallow copy.
+    """
+
+    def __init__(self, functions: List[Callable], safe: bool, mode: str):
+        env = _create_execution_env(safe)
+        self.initial_keys = frozenset(env.keys())
+        self.safe = safe
+        specs = [unwrap_tool(f) for f in functions]
+        self.coroutines: FrozenSet[str] = frozenset(
+            name for name, func, _, _ in specs if asyncio.iscoroutinefunction(func)
+        )
+        self.tools = frozenset(name for name, _, _, _ in specs) - self.coroutines
+        # Only tools marked with @tool(parallel_safe=True) are grouped: the rewrite
+        # sees data flow between calls, not side effects such as files they write.
+        self.parallel_safe: FrozenSet[str] = frozenset(
+            name for name, _, _, parallel_safe in specs if parallel_safe
+        )
+
+        if mode == "async":
+            env["asyncio"] = asyncio
+        env.update(parallel_calls.HELPERS)
+        env.update(asyncify.HELPERS)
+        # Wrappers call the functions of the running execution, found through the
+        # call context, so a cached template keeps no tool (or its owner) alive.
+        for name, _, timeout, _ in specs:
+            if mode == "async":
+                wrapper = _make_async_wrapper(name, timeout, name in self.coroutines)
+            else:
+                wrapper = _make_sync_wrapper(name, timeout)
+            env[name] = wrapper
+
+        # Imports run with the full builtins: the safe ones have no __import__.
+        imports = {"__builtins__": builtins}
+        _setup_env_imports(imports)
+        del imports["__builtins__"]
+        env.update(imports)
+        self.env = env
+
+    def clone(self) -> Dict[str, Any]:
+        env = dict(self.env)
+        if self.safe:
+            # Generated code must not be able to alter the builtins of later runs.
+            env["__builtins__"] = dict(env["__builtins__"])
+        return env
+
+
+def _weak(func: Callable) -> weakref.ref:
+    """Weak reference to func; bound methods, created on every access, via their parts."""
+    return weakref.WeakMethod(func) if inspect.ismethod(func) else weakref.ref(func)
+
+
+class _EnvTemplates:
+    """
+    Small LRU of environment templates, keyed by weak references to the tools, so
+    that the tools of short-lived agents are freed with them.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._templates: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, functions: List[Callable], safe: bool, mode: str) -> _EnvTemplate:
+        try:
+            key = (tuple(_weak(f) for f in functions), safe, mode)
+            hash(key)
+        except TypeError:
+            # Unhashable callables, or ones without weak references: build a
+            # throwaway template.
+            return _EnvTemplate(functions, safe, mode)
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+        template = _EnvTemplate(functions, safe, mode)
+        with self._lock:
+            for dead in [k for k in self._templates if any(r() is None for r in k[0])]:
+                del self._templates[dead]
+            self._templates[key] = template
+            while len(self._templates) > self.maxsize:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self) -> None:
+        with self._lock:
+            self._templates.clear()
+
+
+env_templates = _EnvTemplates()
+
+
+def _functions(tools: List[Callable]) -> Dict[str, Callable]:
+    functions = {}
+    for tool in tools:
+        name, func, _, _ = unwrap_tool(tool)
+        functions[name] = func
+    return functions
 
 
 def _match_results_to_variables(call_results: Dict, variables: Dict) -> None:
-    """Match function call results with variable names."""
-    for func_name, results in list(call_results.items()):
-        for variable_name, variable_value in variables.items():
-            for result in results:
-                if variable_value == result:
-                    call_results[func_name] = variable_name
-                    break
+    """
+    Match function call results with the variables they were assigned to.
+
+    Results are matched by identity: an assignment binds the very object the tool
+    returned, so one pass over the variables suffices and results such as numpy
+    arrays are never compared by value. As before, the last matching variable wins.
+    """
+    # The results are held by call_results, so their ids stay valid here.
+    callers: Dict[int, List[str]] = {}
+    for func_name, results in call_results.items():
+        for result in results:
+            callers.setdefault(id(result), []).append(func_name)
+
+    for variable_name, variable_value in variables.items():
+        for func_name in callers.get(id(variable_value), ()):
+            call_results[func_name] = variable_name
 
 
 def execute_python_code(
@@ -103,39 +539,62 @@ def execute_python_code(
     functions: List[Callable] = [],
     context_variables: Dict[str, Any] = {},
     safe: bool = False,
+    parallel: bool = True,
+    sandbox: Optional["ProcessSandbox"] = None,
+    timeout: Optional[float] = None,
 ) -> FunctionResults:
     """
     Execute Python code with given functions and context variables.
 
     Args:
         code: The Python code to execute.
-        functions: List of functions to make available to the code.
+        functions: List of functions or ToolCalls to make available to the code.
         context_variables: Variables to make available to the code.
         safe: Whether to sandbox the execution environment.
+        parallel: Whether to run consecutive independent calls of parallel safe tools
+            concurrently.
+        sandbox: Run the code in a worker process of this sandbox instead.
+        timeout: Time budget in seconds for the whole execution. Tool calls are cut
+            to the budget left, and the code is stopped at its next line once it is
+            spent. Blocking calls the code makes itself are only interrupted in a sandbox.
 
     Returns:
         FunctionResults containing results, variables and any errors.
     """
-    env = _create_execution_env(safe)
-    initial_keys = set(env.keys())
+    if sandbox is not None:
+        return sandbox.execute(code, functions, context_variables, safe, timeout=timeout)
+
+    template = env_templates.get(functions, safe, "sync")
+    env = template.clone()
+    initial_keys = template.initial_keys
 
     if context_variables and isinstance(context_variables, dict):
         env.update(context_variables)
 
-    call_results = {}
-    errors = []
-
-    for func in functions:
-        env[func.__name__] = _make_sync_wrapper(
-            func.__name__, func, call_results, errors
-        )
-
-    _setup_env_imports(env)
+    context = _CallContext(_functions(functions), timeout)
+    call_results, errors = context.call_results, context.errors
 
+    token = _call_context.set(context)
     try:
-        exec(code, env)
+        compiled = code_cache.get(
+            code,
+            "sync",
+            template.tools,
+            parallel=template.parallel_safe if parallel else frozenset(),
+        )
+        trace = _deadline_trace(context)
+        if trace is None:
+            exec(compiled, env)
+        else:
+            sys.settrace(trace)
+            try:
+                exec(compiled, env)
+            finally:
+                sys.settrace(None)
     except Exception as e:
         errors.append(str(e))
+    finally:
+        _call_context.reset(token)
 
     variables = {
         k: v
@@ -153,48 +612,70 @@ async def async_execute_python_code(
     functions: List[Callable] = [],
     context_variables: Dict[str, Any] = {},
     safe: bool = False,
+    parallel: bool = True,
+    sandbox: Optional["ProcessSandbox"] = None,
+    timeout: Optional[float] = None,
 ) -> FunctionResults:
     """
     Asynchronously execute Python code with given functions and context variables.
 
     Args:
         code: The Python code to execute.
-        functions: List of functions to make available to the code.
+        functions: List of functions or ToolCalls to make available to the code.
         context_variables: Variables to make available to the code.
         safe: Whether to sandbox the execution environment.
+        parallel: Whether to await consecutive independent calls of parallel safe tools
+            concurrently.
+        sandbox: Run the code in a worker process of this sandbox instead.
+        timeout: Time budget in seconds for the whole execution, after which it is
+            cancelled. Tool calls are cut to the budget left, and code that does not
+            await is stopped at its next line. Blocking calls the code makes itself are
+            only interrupted in a sandbox.
 
     Returns:
         FunctionResults containing results, variables and any errors.
     """
-    env = _create_execution_env(safe)
-    initial_keys = set(env.keys())
+    if sandbox is not None:
+        return await sandbox.async_execute(
+            code, functions, context_variables, safe, timeout
+        )
+
+    template = env_templates.get(functions, safe, "async")
+    env = template.clone()
+    initial_keys = template.initial_keys
 
     if context_variables and isinstance(context_variables, dict):
         env.update(context_variables)
 
-    call_results = {}
-    errors = []
-    env["asyncio"] = asyncio
-
-    for func in functions:
-        wrapper = await _make_async_wrapper(func.__name__, func, call_results, errors)
-        env[func.__name__] = wrapper
-        if asyncio.iscoroutinefunction(func):
-            code = code.replace(func.__name__, f"await {func.__name__}")
-
-    _setup_env_imports(env)
+    context = _CallContext(_functions(functions), timeout)
+    call_results, errors = context.call_results, context.errors
 
+    token = _call_context.set(context)
     try:
-        async_code = "async def __async_exec():\n"
-        async_code += "".join(f"    {line}\n" for line in code.splitlines())
-        async_code += "\n    return locals()"
-
         exec_globals = {}
-        exec(async_code, env, exec_globals)
-        result = await exec_globals["__async_exec"]()
+        compiled = code_cache.get(
+            code,
+            "async",
+            template.tools,
+            template.coroutines,
+            template.parallel_safe if parallel else frozenset(),
+        )
+        exec(compiled, env, exec_globals)
+        coro = exec_globals["__async_exec"]()
+        trace = _deadline_trace(context)
+        if trace is not None:
+            coro = _traced(coro, trace)
+        result = await asyncio.wait_for(coro, timeout)
         env.update(result)
+    except ToolTimeoutError as e:
+        # Also a TimeoutError, but raised by a tool call rather than wait_for.
+        errors.append(str(e))
+    except asyncio.TimeoutError:
+        errors.append(f"Execution timed out after {timeout}s")
     except Exception as e:
         errors.append(str(e))
+    finally:
+        _call_context.reset(token)
 
     variables = {
         k: v
@@ -211,6 +692,8 @@ def execute_tool_call(
     functions: List[Callable],
     completion: str,
     show_completion: bool = False,
+    sandbox: Optional["ProcessSandbox"] = None,
+    timeout: Optional[float] = None,
 ) -> ExecutionResults:
     """
     Execute a tool call with the given functions and completion.
@@ -219,6 +702,8 @@ def execute_tool_call(
         functions: List of functions to make available.
         completion: Code completion to execute.
         show_completion: Whether to log the completion.
+        sandbox: Run the code in a worker process of this sandbox.
+        timeout: Time budget in seconds for executing the code.
 
     Returns:
         ExecutionResults containing the execution outcome.
@@ -231,7 +716,9 @@ def execute_tool_call(
             logger.info(f"Completion: {completion}")
 
         code = extract_codeblocks(completion) if "```" in completion else completion
-        results = execute_python_code(code, functions)
+        results = execute_python_code(
+            code, functions, sandbox=sandbox, timeout=timeout
+        )
         errors.extend(results.errors)
 
     except Exception as e:
@@ -250,6 +737,8 @@ async def async_execute_tool_call(
     functions: List[Callable],
     completion: str,
     show_completion: bool = False,
+    sandbox: Optional["ProcessSandbox"] = None,
+    timeout: Optional[float] = None,
 ) -> ExecutionResults:
     """
     Asynchronously execute a tool call with the given functions and completion.
@@ -258,6 +747,8 @@ async def async_execute_tool_call(
         functions: List of functions to make available.
         completion: Code completion to execute.
         show_completion: Whether to log the completion.
+        sandbox: Run the code in a worker process of this sandbox.
+        timeout: Time budget in seconds for executing the code.
 
     Returns:
         ExecutionResults containing the execution outcome.
@@ -270,7 +761,9 @@ async def async_execute_tool_call(
             logger.info(f"Completion: {completion}")
 
         code = extract_codeblocks(completion) if "```" in completion else completion
-        results = await async_execute_python_code(code, functions)
+        results = await async_execute_python_code(
+            code, functions, sandbox=sandbox, timeout=timeout
+        )
         errors.extend(results.errors)
 
     except Exception as e:
@@ -0,0 +1,238 @@
+"""
+Parallel execution of independent tool calls in generated code.
+
+The model writes one-shot parallel calls as consecutive statements:
+
+    weather = get_weather("Paris")
+    summary = search_wikipedia("Paris")
+
+Consecutive statements that each make a single call to a parallel safe tool, whose
+arguments contain no other calls and do not read what the earlier statements of the run
+assign, form a group. Only data flow through variables is visible here, so tools whose
+calls depend on each other's side effects (a directory created by one and written to by
+the next) must not be marked parallel safe. The group is rewritten to start every call
+at once and then bind the results in the original order:
+
+    __parallel_0 = __parallel__(lambda: get_weather("Paris"), lambda: search_wikipedia("Paris"))
+    weather = __outcome__(__parallel_0, 0)
+    summary = __outcome__(__parallel_0, 1)
+
+In async code, awaited tool calls (including sync tools offloaded to threads, see
+asyncify) are awaited together with __gather__ instead. A call that raises makes
+its statement raise, so later statements of the group do not bind, as before; the other
+calls of the group have run by then.
+"""
+
+import ast
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, FrozenSet, List, Optional, Set, Tuple
+
+from .asyncify import OFFLOAD
+
+PARALLEL = "__parallel__"
+GATHER = "__gather__"
+OUTCOME = "__outcome__"
+
+# Threads per group of sync calls.
+MAX_WORKERS = 16
+
+# Expressions allowed in arguments: no calls, awaits, scopes or assignments, so
+# evaluating them in another order cannot change the program.
+_UNSAFE = (
+    ast.Call,
+    ast.Await,
+    ast.NamedExpr,
+    ast.Lambda,
+    ast.ListComp,
+    ast.SetComp,
+    ast.DictComp,
+    ast.GeneratorExp,
+    ast.Yield,
+    ast.YieldFrom,
+)
+
+Outcome = Tuple[Any, Optional[BaseException]]
+
+
+def _run(thunk: Callable[[], Any]) -> Outcome:
+    try:
+        return thunk(), None
+    except Exception as e:
+        return None, e
+
+
+def run_parallel(*thunks: Callable[[], Any]) -> List[Outcome]:
+    """Call thunks on a thread pool, each in a copy of the caller's context."""
+    with ThreadPoolExecutor(min(len(thunks), MAX_WORKERS)) as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _run, thunk) for thunk in thunks
+        ]
+        return [f.result() for f in futures]
+
+
+async def _capture(awaitable) -> Outcome:
+    try:
+        return await awaitable, None
+    except Exception as e:
+        return None, e
+
+
+async def gather(*awaitables) -> List[Outcome]:
+    """Await coroutines concurrently."""
+    return list(await asyncio.gather(*(_capture(a) for a in awaitables)))
+
+
+def outcome(outcomes: List[Outcome], i: int) -> Any:
+    """Return the i-th result, or raise its exception."""
+    value, error = outcomes[i]
+    if error is not None:
+        raise error
+    return value
+
+
+HELPERS = {PARALLEL: run_parallel, GATHER: gather, OUTCOME: outcome}
+
+
+class _Call:
+    """A statement making a single tool call."""
+
+    def __init__(self, stmt: ast.stmt, call: ast.Call, awaited: bool):
+        self.stmt = stmt
+        self.call = call
+        self.awaited = awaited
+        self.writes: Set[str] = set()
+        if isinstance(stmt, ast.Assign):
+            for target in stmt.targets:
+                self.writes.update(_names(target, ast.Store))
+        self.reads = _names(call, ast.Load)
+
+
+def _names(node: ast.AST, ctx: type) -> Set[str]:
+    return {
+        n.id for n in ast.walk(node) if isinstance(n, ast.Name) and isinstance(n.ctx, ctx)
+    }
+
+
+def _is_target(node: ast.expr) -> bool:
+    if isinstance(node, ast.Name):
+        return True
+    if isinstance(node, (ast.Tuple, ast.List)):
+        return all(isinstance(e, ast.Name) for e in node.elts)
+    return False
+
+
+def _tool_call(
+    stmt: ast.stmt, tools: FrozenSet[str], coroutines: FrozenSet[str]
+) -> Optional[_Call]:
+    if isinstance(stmt, ast.Assign):
+        if not all(_is_target(t) for t in stmt.targets):
+            return None
+    elif not isinstance(stmt, ast.Expr):
+        return None
+
+    value, awaited = stmt.value, False
+    if isinstance(value, ast.Await):
+        value, awaited = value.value, True
+    if not (isinstance(value, ast.Call) and isinstance(value.func, ast.Name)):
+        return None
+    arguments = value.args + [k.value for k in value.keywords]
+    if awaited and value.func.id == OFFLOAD:
+        # A sync tool offloaded to a thread by AwaitTools.
+        if not (value.args and isinstance(value.args[0], ast.Name)):
+            return None
+        if value.args[0].id not in tools:
+            return None
+        arguments = arguments[1:]
+    elif value.func.id not in (coroutines if awaited else tools):
+        return None
+    if any(isinstance(n, _UNSAFE) for a in arguments for n in ast.walk(a)):
+        return None
+    return _Call(stmt, value, awaited)
+
+
+def _rewrite(group: List[_Call], n: int) -> List[ast.stmt]:
+    results = f"__parallel_{n}"
+    if group[0].awaited:
+        start = ast.Await(
+            ast.Call(ast.Name(GATHER, ast.Load()), [c.call for c in group], [])
+        )
+    else:
+        no_args = ast.arguments(
+            posonlyargs=[], args=[], kwonlyargs=[], kw_defaults=[], defaults=[]
+        )
+        start = ast.Call(
+            ast.Name(PARALLEL, ast.Load()),
+            [ast.Lambda(no_args, c.call) for c in group],
+            [],
+        )
+    stmts = [
+        ast.copy_location(
+            ast.Assign([ast.Name(results, ast.Store())], start), group[0].stmt
+        )
+    ]
+    for i, c in enumerate(group):
+        value = ast.Call(
+            ast.Name(OUTCOME, ast.Load()),
+            [ast.Name(results, ast.Load()), ast.Constant(i)],
+            [],
+        )
+        if isinstance(c.stmt, ast.Assign):
+            stmt = ast.Assign(c.stmt.targets, value)
+        else:
+            stmt = ast.Expr(value)
+        stmts.append(ast.copy_location(stmt, c.stmt))
+    return stmts
+
+
+def parallelize(
+    body: List[ast.stmt], tools: FrozenSet[str], coroutines: FrozenSet[str] = frozenset()
+) -> List[ast.stmt]:
+    """
+    Rewrite runs of independent tool calls in a statement list to run concurrently.
+
+    Args:
+        body: Top-level statements of the generated code.
+        tools: Names of sync tools whose calls, or awaited offloaded calls, may run
+            concurrently.
+        coroutines: Names of coroutine tools whose awaited calls may be gathered.
+
+    Returns:
+        The new statement list. Statements that are not tool calls are kept as they are.
+    """
+    out: List[ast.stmt] = []
+    group: List[_Call] = []
+    writes: Set[str] = set()
+    reads: Set[str] = set()
+    groups = 0
+
+    def flush():
+        nonlocal groups
+        if len(group) > 1:
+            out.extend(_rewrite(group, groups))
+            groups += 1
+        else:
+            out.extend(c.stmt for c in group)
+        group.clear()
+        writes.clear()
+        reads.clear()
+
+    for stmt in body:
+        call = _tool_call(stmt, tools, coroutines)
+        if call is None:
+            flush()
+            out.append(stmt)
+            continue
+        independent = (
+            call.reads.isdisjoint(writes)
+            and call.writes.isdisjoint(writes | reads)
+            and (not group or group[0].awaited == call.awaited)
+        )
+        if not independent:
+            flush()
+        group.append(call)
+        writes.update(call.writes)
+        reads.update(call.reads)
+    flush()
+    return out
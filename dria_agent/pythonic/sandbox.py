@@ -0,0 +1,365 @@
+"""
+Process-isolated execution of generated code.
+
+ProcessSandbox keeps a pool of pre-warmed worker processes with the engine already
+imported. Each execution runs in a worker under CPU time and address space limits
+and a wall-clock deadline. A worker that runs past its deadline is killed and
+replaced, so a runaway loop or a huge allocation in model-generated code cannot take
+down the calling process.
+
+Tools stay in the parent: inside the worker every tool is a proxy that sends the call
+back over the worker's pipe and waits for the result. Messages above
+shm_threshold bytes (large arguments, results and variables) are passed through
+shared memory instead of the pipe.
+"""
+
+import asyncio
+import multiprocessing
+import pickle
+import queue
+import signal
+import threading
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .engine import async_call_with_timeout, call_with_timeout, unwrap_tool
+from .schemas import FunctionResults
+from .util import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class ToolError(Exception):
+    """A tool raised in the parent process; carries its message into the worker."""
+
+
+def _send(conn: Connection, kind: str, payload: Any, shm_threshold: int) -> None:
+    data = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) <= shm_threshold:
+        conn.send((kind, None, data))
+        return
+    shm = SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[: len(data)] = data
+        # The receiver unlinks the segment once it has copied it out.
+        conn.send((kind, shm.name, len(data)))
+    finally:
+        shm.close()
+
+
+def _recv(conn: Connection) -> Tuple[str, Any]:
+    kind, shm_name, data = conn.recv()
+    if shm_name is not None:
+        shm = SharedMemory(name=shm_name)
+        try:
+            data = bytes(shm.buf[:data])
+        finally:
+            shm.close()
+            shm.unlink()
+    return kind, pickle.loads(data)
+
+
+def _proxy(conn: Connection, lock: threading.Lock, name: str, shm_threshold: int):
+    def call(*args, **kwargs):
+        # One round trip at a time: the pipe carries a single conversation.
+        with lock:
+            _send(conn, "call", (name, args, kwargs), shm_threshold)
+            kind, value = _recv(conn)
+        if kind == "raise":
+            raise ToolError(value)
+        return value
+
+    call.__name__ = name
+    return call
+
+
+def _set_limits(cpu_seconds: Optional[float], memory_bytes: Optional[int]) -> None:
+    if resource is None:
+        return
+    if cpu_seconds is not None:
+        # RLIMIT_CPU counts the whole life of the process, so the budget is added to
+        # what earlier executions used. Only the soft limit moves: SIGXCPU kills the
+        # worker, and an unprivileged process could not raise a lowered hard limit.
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = usage.ru_utime + usage.ru_stime
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(used + cpu_seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    if memory_bytes is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            memory_bytes = min(memory_bytes, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, hard))
+
+
+def _picklable(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop values that cannot leave the worker, such as imported modules."""
+    try:
+        pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        return payload
+    except Exception:
+        pass
+    kept = {}
+    for key, value in payload.items():
+        try:
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            kept[key] = value
+        except Exception:
+            pass
+    return kept
+
+
+def _worker(conn: Connection, shm_threshold: int) -> None:
+    """Worker process loop: run jobs until the pipe closes."""
+    from .engine import execute_python_code
+
+    # Interrupts are for the parent, which kills workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    lock = threading.Lock()
+    _send(conn, "ready", None, shm_threshold)
+    while True:
+        try:
+            kind, job = _recv(conn)
+        except (EOFError, OSError):
+            return
+        if kind != "run":
+            continue
+        _set_limits(job["cpu_seconds"], job["memory_bytes"])
+        functions = [_proxy(conn, lock, name, shm_threshold) for name in job["tools"]]
+        # Tool calls are serialised over the pipe, so parallel groups would not help.
+        results = execute_python_code(
+            job["code"],
+            functions,
+            job["context_variables"],
+            safe=job["safe"],
+            parallel=False,
+        )
+        payload = {
+            "results": _picklable(results.results),
+            "data": _picklable(results.data),
+            "errors": results.errors,
+        }
+        _send(conn, "done", payload, shm_threshold)
+
+
+class _Worker:
+    def __init__(self, ctx, shm_threshold: int):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker, args=(child, shm_threshold), daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def wait_ready(self) -> None:
+        """Block until the worker has imported the engine."""
+        kind, _ = _recv(self.conn)
+        if kind != "ready":
+            raise RuntimeError(f"Unexpected message from sandbox worker: {kind}")
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessSandbox:
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 30.0,
+        cpu_seconds: Optional[float] = 10.0,
+        memory_mb: Optional[int] = 1024,
+        shm_threshold: int = 1024 * 1024,
+        start_method: Optional[str] = None,
+    ):
+        """
+        Args:
+            workers: Number of worker processes, i.e. concurrent executions.
+            timeout: Wall-clock seconds per execution, tool calls included. The worker
+                is killed and replaced when it runs over.
+            cpu_seconds: CPU seconds per execution in the worker, None for no limit.
+            memory_mb: Address space limit of a worker in MiB, None for no limit.
+            shm_threshold: Messages larger than this many bytes go through shared memory.
+            start_method: multiprocessing start method, defaults to forkserver where
+                available so workers fork from a small clean process.
+        """
+        if resource is None:
+            raise RuntimeError("ProcessSandbox requires a POSIX system")
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if "forkserver" in methods else "spawn"
+        self.ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers, including replacements for killed ones, fork with the engine
+            # already imported.
+            self.ctx.set_forkserver_preload(["dria_agent.pythonic.engine"])
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_mb * 1024 * 1024 if memory_mb is not None else None
+        self.shm_threshold = shm_threshold
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        started = [self._start() for _ in range(workers)]
+        for worker in started:
+            self._ready(worker)
+
+    def _start(self) -> _Worker:
+        return _Worker(self.ctx, self.shm_threshold)
+
+    def _spawn(self) -> None:
+        self._ready(self._start())
+
+    def _ready(self, worker: _Worker) -> None:
+        worker.wait_ready()
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker: _Worker) -> None:
+        worker.kill()
+        with self._lock:
+            # close() may already have taken the worker out of the pool.
+            if worker in self._workers:
+                self._workers.remove(worker)
+            if self._closed:
+                return
+        self._spawn()
+
+    def execute(
+        self,
+        code: str,
+        functions: List[Callable] = [],
+        context_variables: Dict[str, Any] = {},
+        safe: bool = False,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        timeout: Optional[float] = None,
+    ) -> FunctionResults:
+        """
+        Execute code in a worker process.
+
+        Args:
+            code: The Python code to execute.
+            functions: Tools, called in this process on behalf of the worker.
+            context_variables: Variables to make available to the code, must be picklable.
+            safe: Whether to also strip dangerous builtins inside the worker.
+            loop: Event loop to run coroutine tools on. Without one they run with asyncio.run.
+            timeout: Wall-clock seconds for this execution, at most the sandbox timeout.
+                Tool calls are also cut to their own timeout.
+
+        Returns:
+            FunctionResults from the worker. Timeouts and crashed workers are reported
+            in errors.
+        """
+        if self._closed:
+            raise RuntimeError("ProcessSandbox is closed")
+        tools = {}
+        for tool in functions:
+            name, func, func_timeout, _ = unwrap_tool(tool)
+            tools[name] = func, func_timeout
+        job = {
+            "code": code,
+            "tools": list(tools),
+            "context_variables": dict(context_variables or {}),
+            "safe": safe,
+            "cpu_seconds": self.cpu_seconds,
+            "memory_bytes": self.memory_bytes,
+        }
+
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        worker = self._idle.get()
+        deadline = time.monotonic() + timeout
+        healthy = False
+        try:
+            _send(worker.conn, "run", job, self.shm_threshold)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not worker.conn.poll(remaining):
+                    return self._failed(f"Execution timed out after {timeout}s")
+                kind, payload = _recv(worker.conn)
+                if kind == "done":
+                    healthy = True
+                    return FunctionResults(**payload)
+                name, args, kwargs = payload
+                try:
+                    # The worker cannot see time spent here, so calls get the budget left.
+                    func, func_timeout = tools[name]
+                    limit = deadline - time.monotonic()
+                    if func_timeout is not None:
+                        limit = min(limit, func_timeout)
+                    value = self._call(name, func, args, kwargs, loop, limit)
+                    _send(worker.conn, "return", value, self.shm_threshold)
+                except Exception as e:
+                    _send(worker.conn, "raise", str(e), self.shm_threshold)
+        except (EOFError, OSError):
+            # The worker died, or close() killed it and closed the pipe.
+            if self._closed:
+                return self._failed("ProcessSandbox was closed during execution")
+            worker.process.join()
+            return self._failed(self._exit_reason(worker.process.exitcode))
+        finally:
+            if healthy:
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+
+    async def async_execute(
+        self,
+        code: str,
+        functions: List[Callable] = [],
+        context_variables: Dict[str, Any] = {},
+        safe: bool = False,
+        timeout: Optional[float] = None,
+    ) -> FunctionResults:
+        """Like execute, without blocking the event loop. Coroutine tools run on it."""
+        loop = asyncio.get_running_loop()
+        return await asyncio.to_thread(
+            self.execute, code, functions, context_variables, safe, loop, timeout
+        )
+
+    @staticmethod
+    def _call(name: str, func: Callable, args, kwargs, loop, timeout: float) -> Any:
+        if not asyncio.iscoroutinefunction(func):
+            return call_with_timeout(name, func, args, kwargs, timeout)
+        call = async_call_with_timeout(name, func, args, kwargs, timeout)
+        if loop is None:
+            return asyncio.run(call)
+        return asyncio.run_coroutine_threadsafe(call, loop).result()
+
+    @staticmethod
+    def _failed(error: str) -> FunctionResults:
+        logger.warning(error)
+        return FunctionResults(results={}, data={}, errors=[error])
+
+    @staticmethod
+    def _exit_reason(exitcode: Optional[int]) -> str:
+        if exitcode == -signal.SIGXCPU:
+            return "Execution exceeded its CPU time limit"
+        if exitcode is not None and exitcode < 0:
+            return f"Sandbox worker was killed by {signal.Signals(-exitcode).name}"
+        return f"Sandbox worker exited with code {exitcode}"
+
+    def close(self) -> None:
+        """Kill every worker."""
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.kill()
+
+    def __enter__(self) -> "ProcessSandbox":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
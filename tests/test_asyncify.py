@@ -0,0 +1,69 @@
+import ast
+import asyncio
+
+from dria_agent.pythonic.asyncify import AwaitTools
+from dria_agent.pythonic.engine import async_execute_python_code
+
+TOOLS = frozenset({"compute", "apply"})
+COROUTINES = frozenset({"fetch"})
+
+
+def rewrite(code):
+    tree = AwaitTools(TOOLS, COROUTINES).visit(ast.parse(code))
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def test_coroutine_tools_are_awaited():
+    assert rewrite("r = fetch(url)") == "r = await fetch(url)"
+
+
+def test_sync_tools_are_offloaded():
+    assert rewrite("v = compute(r, n=2)") == "v = await __offload__(compute, r, n=2)"
+
+
+def test_tool_names_in_strings_and_identifiers_are_untouched():
+    code = 'compute_total = 1\nmsg = "fetch(url) and compute(x)"\nrefetch(x)\nobj.fetch(x)'
+    assert rewrite(code) == code.replace('"', "'")
+
+
+def test_tool_used_as_a_value_is_untouched():
+    assert rewrite("f = fetch\ng = [compute]") == "f = fetch\ng = [compute]"
+
+
+def test_nested_scopes_are_untouched():
+    code = (
+        "def helper(x):\n    return compute(x)\n"
+        "key = lambda x: fetch(x)\n"
+        "gen = (compute(x) for x in xs)\n"
+        "class C:\n    v = compute(1)"
+    )
+    assert rewrite(code) == ast.unparse(ast.parse(code))
+
+
+def test_comprehensions_that_can_await_are_rewritten():
+    assert rewrite("vs = [compute(x) for x in xs]") == (
+        "vs = [await __offload__(compute, x) for x in xs]"
+    )
+
+
+def test_already_awaited_calls_are_awaited_once():
+    assert rewrite("r = await fetch(url)") == "r = await fetch(url)"
+    assert rewrite("v = await compute(x)") == "v = await __offload__(compute, x)"
+    assert rewrite("await asyncio.sleep(0)") == "await asyncio.sleep(0)"
+
+
+def test_nested_tool_calls_are_rewritten_inside_out():
+    assert rewrite("v = compute(fetch(url))") == (
+        "v = await __offload__(compute, await fetch(url))"
+    )
+
+
+def test_tool_with_a_func_keyword_can_be_offloaded():
+    def apply(func: str, value: int) -> str:
+        return f"{func}({value})"
+
+    results = asyncio.run(
+        async_execute_python_code('r = apply(func="f", value=2)', [apply])
+    )
+    assert not results.errors
+    assert results.data["r"] == "f(2)"
@@ -0,0 +1,94 @@
+import json
+import multiprocessing
+
+import numpy as np
+
+from dria_agent.agent.cache import EmbeddingCache
+
+DIM = 8
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def test_round_trip_through_a_new_instance(tmp_path):
+    texts = [f"def tool_{i}(): pass" for i in range(5)]
+    stored = vectors(5)
+    EmbeddingCache("model", DIM, str(tmp_path)).put(texts, stored)
+
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    assert len(cache) == 5
+    hits, cached, misses = cache.get(texts[::-1] + ["def other(): pass"])
+    assert hits == [0, 1, 2, 3, 4] and misses == [5]
+    np.testing.assert_allclose(cached, stored[::-1].astype(np.float16))
+
+
+def test_contiguous_hits_are_a_view_of_the_mapping(tmp_path):
+    texts = [f"t{i}" for i in range(4)]
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    cache.put(texts, vectors(4))
+    _, cached, _ = cache.get(texts[1:3])
+    assert isinstance(cached, np.memmap)
+    _, cached, _ = cache.get([texts[2], texts[0]])
+    assert not isinstance(cached, np.memmap)
+
+
+def test_put_skips_cached_texts_and_duplicates(tmp_path):
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    cache.put(["a", "b"], vectors(2))
+    cache.put(["b", "c", "c"], vectors(3, seed=1))
+    assert len(cache) == 3
+    with open(cache.manifest_path) as f:
+        assert json.load(f)["rows"] == 3
+
+
+def test_model_or_dim_mismatch_invalidates(tmp_path):
+    EmbeddingCache("model", DIM, str(tmp_path)).put(["a"], vectors(1))
+    assert len(EmbeddingCache("other", DIM, str(tmp_path))) == 0
+    assert len(EmbeddingCache("model", DIM * 2, str(tmp_path))) == 0
+
+    # A manifest that disagrees with its directory is ignored too.
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    with open(cache.manifest_path) as f:
+        manifest = json.load(f)
+    manifest["model_name"] = "renamed"
+    with open(cache.manifest_path, "w") as f:
+        json.dump(manifest, f)
+    assert len(EmbeddingCache("model", DIM, str(tmp_path))) == 0
+
+
+def test_rows_missing_on_disk_are_dropped(tmp_path):
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    cache.put(["a", "b"], vectors(2))
+    with open(cache.vectors_path, "r+b") as f:
+        f.truncate(DIM * 2)  # only the first float16 row survives
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    hits, _, misses = cache.get(["a", "b"])
+    assert hits == [0] and misses == [1]
+
+
+def _put(args):
+    cache_dir, worker = args
+    texts = [f"w{worker}-{i}" for i in range(20)] + [f"shared-{i}" for i in range(20)]
+    EmbeddingCache("model", DIM, cache_dir).put(texts, vectors(40, seed=worker))
+
+
+def test_concurrent_puts_from_processes(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(4) as pool:
+        pool.map(_put, [(str(tmp_path), w) for w in range(4)])
+
+    cache = EmbeddingCache("model", DIM, str(tmp_path))
+    assert len(cache) == 4 * 20 + 20
+    with open(cache.manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest["rows"] == len(cache)
+    assert sorted(manifest["keys"].values()) == list(range(len(cache)))
+    for worker in range(4):
+        texts = [f"w{worker}-{i}" for i in range(20)]
+        hits, cached, _ = cache.get(texts)
+        assert len(hits) == 20
+        np.testing.assert_allclose(
+            cached, vectors(40, seed=worker)[:20].astype(np.float16)
+        )
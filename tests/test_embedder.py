@@ -0,0 +1,37 @@
+import gc
+import weakref
+
+import numpy as np
+
+from dria_agent.agent.embedder import BaseEmbedding
+
+
+class HashEmbedding(BaseEmbedding):
+    def __init__(self):
+        super().__init__("hash", 4)
+
+    def batch_embed(self, texts):
+        return np.array([[hash(t) % 7, len(t), 1, 0] for t in texts], np.float32)
+
+    def _embed_query(self, text):
+        return self.batch_embed([text])[0]
+
+
+def test_micro_batching_returns_the_same_vectors():
+    embedding = HashEmbedding()
+    expected = embedding.batch_embed(["a", "b"])
+    embedding.enable_micro_batching()
+    assert (embedding.batch_embed(["a", "b"]) == expected).all()
+
+
+def test_micro_batcher_does_not_keep_the_embedding_alive():
+    embedding = HashEmbedding()
+    embedding.enable_micro_batching()
+    embedding.batch_embed(["a"])
+    worker = embedding.doc_batcher._worker
+    ref = weakref.ref(embedding)
+    del embedding
+    gc.collect()
+    assert ref() is None
+    worker.join(2)
+    assert not worker.is_alive()
@@ -0,0 +1,148 @@
+import asyncio
+import gc
+import time
+import weakref
+
+import pytest
+
+from dria_agent.agent.tool import tool
+from dria_agent.pythonic.engine import (
+    ToolTimeoutError,
+    async_call_with_timeout,
+    async_execute_python_code,
+    call_with_timeout,
+    env_templates,
+    execute_python_code,
+)
+
+
+class Agent:
+    def __init__(self, offset):
+        self.offset = offset
+
+    def shift(self, x: int) -> int:
+        return x + self.offset
+
+
+def test_templates_are_reused_for_the_same_tools():
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    env_templates.clear()
+    first = env_templates.get([add], False, "sync")
+    assert env_templates.get([add], False, "sync") is first
+    assert env_templates.get([add], True, "sync") is not first
+
+
+def test_bound_methods_reuse_the_template_of_their_instance():
+    one, two = Agent(1), Agent(2)
+    assert execute_python_code("x = shift(1)", [one.shift]).data["x"] == 2
+    assert execute_python_code("x = shift(1)", [two.shift]).data["x"] == 3
+    assert env_templates.get([one.shift], False, "sync") is env_templates.get(
+        [one.shift], False, "sync"
+    )
+
+
+def test_cached_templates_do_not_keep_tools_alive():
+    agent = Agent(1)
+    results = execute_python_code("x = shift(1)", [agent.shift])
+    assert results.data["x"] == 2
+    ref = weakref.ref(agent)
+    del agent, results
+    gc.collect()
+    assert ref() is None
+
+
+def sleepy(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+async def async_sleepy(seconds: float) -> float:
+    await asyncio.sleep(seconds)
+    return seconds
+
+
+def test_call_with_timeout():
+    assert call_with_timeout("sleepy", sleepy, (0.01,), {}, 1) == 0.01
+    assert call_with_timeout("sleepy", sleepy, (0.01,), {}, None) == 0.01
+    start = time.monotonic()
+    with pytest.raises(ToolTimeoutError, match="sleepy timed out"):
+        call_with_timeout("sleepy", sleepy, (1,), {}, 0.1)
+    assert time.monotonic() - start < 0.5
+    with pytest.raises(ZeroDivisionError):
+        call_with_timeout("divide", lambda: 1 / 0, (), {}, 1)
+
+
+def test_async_call_with_timeout():
+    call = async_call_with_timeout("async_sleepy", async_sleepy, (0.01,), {}, 1)
+    assert asyncio.run(call) == 0.01
+    with pytest.raises(ToolTimeoutError, match="async_sleepy timed out"):
+        asyncio.run(async_call_with_timeout("async_sleepy", async_sleepy, (1,), {}, 0.1))
+    with pytest.raises(ToolTimeoutError, match="No time left"):
+        asyncio.run(async_call_with_timeout("async_sleepy", async_sleepy, (1,), {}, 0))
+
+
+def test_tool_timeout_error_is_a_timeout_error():
+    assert issubclass(ToolTimeoutError, TimeoutError)
+
+
+def test_tool_settings_stay_on_the_tool_call():
+    def plain(x: int) -> int:
+        """Plain function."""
+        return x
+
+    call = tool(timeout=1, parallel_safe=True)(plain)
+    assert (call.timeout, call.parallel_safe) == (1, True)
+    assert not hasattr(plain, "timeout") and not hasattr(plain, "parallel_safe")
+    # Bound methods take no attributes, they must still become tools.
+    assert tool(timeout=1)(Agent(1).shift)(1) == 2
+
+
+def test_tool_timeout_in_execution():
+    slow = tool(timeout=0.1)(sleepy)
+    start = time.monotonic()
+    results = execute_python_code("x = sleepy(1)", [slow])
+    assert time.monotonic() - start < 0.5
+    assert "sleepy timed out" in results.errors[-1]
+    assert execute_python_code("x = sleepy(0.01)", [slow]).data["x"] == 0.01
+
+
+def test_budget_cuts_tool_calls():
+    start = time.monotonic()
+    results = execute_python_code(
+        "a = sleepy(0.2)\nb = sleepy(1)", [tool(sleepy)], timeout=0.4
+    )
+    assert time.monotonic() - start < 0.8
+    assert results.data["a"] == 0.2 and "b" not in results.data
+    assert "sleepy timed out" in results.errors[-1]
+
+
+def test_budget_stops_code_between_tool_calls():
+    start = time.monotonic()
+    results = execute_python_code("while True: pass", timeout=0.2)
+    assert time.monotonic() - start < 1
+    assert results.errors == ["Execution timed out after 0.2s"]
+
+
+def test_async_budget_cancels_coroutine_tools():
+    start = time.monotonic()
+    results = asyncio.run(
+        async_execute_python_code("x = async_sleepy(1)", [async_sleepy], timeout=0.2)
+    )
+    assert time.monotonic() - start < 0.8
+    assert results.errors == ["Execution timed out after 0.2s"]
+
+
+def test_async_budget_stops_code_that_does_not_await():
+    start = time.monotonic()
+    results = asyncio.run(async_execute_python_code("while True: pass", timeout=0.2))
+    assert time.monotonic() - start < 1
+    assert results.errors == ["Execution timed out after 0.2s"]
+
+
+def test_async_budget_reports_blocking_code_once_it_returns():
+    code = "import time\ntime.sleep(0.4)\nx = 1"
+    results = asyncio.run(async_execute_python_code(code, timeout=0.1))
+    assert results.errors == ["Execution timed out after 0.1s"]
+    assert "x" not in results.data
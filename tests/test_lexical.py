@@ -0,0 +1,92 @@
+import pytest
+
+from dria_agent.agent.lexical import BM25Index, tokenize
+
+
+def test_tokenize_splits_identifiers_and_keeps_them_whole():
+    assert tokenize("list_containers") == ["list_container", "list", "container"]
+    assert tokenize("getWeather") == ["getweather", "get", "weather"]
+
+
+def test_tokenize_drops_stopwords_and_stems_plurals():
+    assert tokenize("Please list the containers") == ["list", "container"]
+    assert tokenize("class address bus") == ["class", "address", "bus"]
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add("list_containers", "List running docker containers", "list_containers")
+    index.add("stop_container", "Stop a docker container by id", "stop_container")
+    index.add("get_weather", "Get the weather forecast for a city", "get_weather")
+    return index
+
+
+def test_search_ranks_name_matches_first(index):
+    hits = index.search("stop container", 3)
+    assert hits[0][0] == "stop_container"
+    assert [id for id, _ in hits] == ["stop_container", "list_containers"]
+    assert index.search("unrelated words", 3) == []
+
+
+def test_remove_and_re_add(index):
+    index.remove("get_weather")
+    assert index.search("weather", 3) == []
+    assert "weather" not in index.postings
+    index.add("get_weather", "Weather forecast", "get_weather")
+    assert index.search("weather", 3)[0][0] == "get_weather"
+
+
+def test_copy_is_independent(index):
+    other = index.copy()
+    other.remove("get_weather")
+    assert index.search("weather", 1)[0][0] == "get_weather"
+    assert other.search("weather", 1) == []
+
+
+def test_confident_requires_every_query_term_in_the_best_hit(index):
+    hits = index.search("weather forecast", 3)
+    assert index.confident("weather forecast", hits, 1)
+    hits = index.search("weather tomorrow", 3)
+    assert not index.confident("weather tomorrow", hits, 1)
+
+
+def test_confident_requires_a_margin_over_the_runner_up(index):
+    hits = index.search("docker container", 3)
+    assert len(hits) == 2 and hits[0][1] < index.margin * hits[1][1]
+    assert not index.confident("docker container", hits, 1)
+
+    index.margin = hits[0][1] / hits[1][1]
+    assert index.confident("docker container", hits, 1)
+
+
+def test_confident_requires_k_hits_and_fast_path(index):
+    hits = index.search("weather forecast", 3)
+    assert len(hits) == 1
+    assert not index.confident("weather forecast", hits, 2)
+    assert not index.confident("weather forecast", [], 1)
+    index.fast_path = False
+    assert not index.confident("weather forecast", hits, 1)
+
+
+def test_rrf_fuse_rewards_agreement():
+    index = BM25Index(rrf_k=60)
+    dense = [("a", 0.9), ("b", 0.8), ("c", 0.1)]
+    lexical = [("b", 5.0), ("d", 1.0)]
+    fused = index.fuse(dense, lexical, 3)
+    assert [id for id, _ in fused] == ["b", "a", "d"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+
+
+def test_weighted_fuse_uses_min_max_normalised_scores():
+    index = BM25Index(fusion="weighted", dense_weight=0.75)
+    dense = [("a", 0.9), ("b", 0.5)]
+    lexical = [("b", 10.0), ("c", 2.0)]
+    fused = dict(index.fuse(dense, lexical, 3))
+    assert fused == pytest.approx({"a": 0.75, "b": 0.25, "c": 0.0})
+
+
+def test_unknown_fusion_is_rejected():
+    with pytest.raises(ValueError):
+        BM25Index(fusion="max")
@@ -0,0 +1,177 @@
+import ast
+import asyncio
+import os
+import threading
+import time
+
+from dria_agent.agent.tool import tool
+from dria_agent.pythonic.engine import async_execute_python_code, execute_python_code
+from dria_agent.pythonic.parallel import parallelize
+
+TOOLS = frozenset({"fetch", "search", "save"})
+
+
+def rewrite(code, tools=TOOLS, coroutines=frozenset()):
+    body = parallelize(ast.parse(code).body, tools, coroutines)
+    return ast.unparse(ast.fix_missing_locations(ast.Module(body, [])))
+
+
+def test_groups_independent_calls():
+    out = rewrite('a = fetch("x")\nb = search("y")\nsave(1)')
+    assert out.splitlines() == [
+        "__parallel_0 = __parallel__(lambda: fetch('x'), lambda: search('y'), lambda: save(1))",
+        "a = __outcome__(__parallel_0, 0)",
+        "b = __outcome__(__parallel_0, 1)",
+        "__outcome__(__parallel_0, 2)",
+    ]
+
+
+def test_single_call_is_left_alone():
+    assert rewrite('a = fetch("x")') == "a = fetch('x')"
+
+
+def test_read_after_write_breaks_group():
+    out = rewrite('a = fetch("x")\nb = search(a)\nc = fetch("z")')
+    assert "__parallel_0 = __parallel__(lambda: search(a), lambda: fetch('z'))" in out
+    assert out.startswith("a = fetch('x')")
+
+
+def test_write_after_read_breaks_group():
+    out = rewrite("b = fetch(a)\na = search(1)")
+    assert "__parallel__" not in out
+
+
+def test_write_after_write_breaks_group():
+    out = rewrite("a = fetch(1)\na = search(2)")
+    assert "__parallel__" not in out
+
+
+def test_other_statements_break_group():
+    out = rewrite("a = fetch(1)\nprint(a)\nb = search(2)")
+    assert "__parallel__" not in out
+
+
+def test_nested_calls_and_unknown_functions_are_not_grouped():
+    assert "__parallel__" not in rewrite("a = fetch(len(x))\nb = search(2)")
+    assert "__parallel__" not in rewrite("a = fetch(1)\nb = other(2)")
+    assert "__parallel__" not in rewrite("a = fetch(1)\nb = search(2)", tools=frozenset())
+
+
+def test_attribute_and_subscript_targets_are_not_grouped():
+    assert "__parallel__" not in rewrite("x.a = fetch(1)\nx.b = search(2)")
+    assert "__parallel__" not in rewrite("x[0] = fetch(1)\nx[1] = search(2)")
+
+
+def test_awaited_calls_are_gathered_separately():
+    out = rewrite(
+        "a = await fetch(1)\nb = await search(2)\nc = save(3)",
+        tools=frozenset({"save"}),
+        coroutines=frozenset({"fetch", "search"}),
+    )
+    assert "__parallel_0 = await __gather__(fetch(1), search(2))" in out
+    assert out.endswith("c = save(3)")
+
+
+def test_parallel_safe_calls_run_concurrently():
+    @tool(parallel_safe=True)
+    def slow(x: int) -> int:
+        """Slow lookup."""
+        time.sleep(0.2)
+        return x
+
+    start = time.monotonic()
+    results = execute_python_code("a = slow(1)\nb = slow(2)\nc = slow(3)", [slow])
+    assert time.monotonic() - start < 0.45
+    assert not results.errors
+    assert [results.data[k] for k in "abc"] == [1, 2, 3]
+
+
+def test_tools_are_serial_unless_marked_parallel_safe():
+    order = []
+
+    @tool
+    def step(i: int) -> int:
+        """Record a step."""
+        time.sleep(0.01 * (4 - i))
+        order.append(i)
+        return i
+
+    results = execute_python_code("step(1)\nstep(2)\nstep(3)", [step])
+    assert not results.errors
+    assert order == [1, 2, 3]
+
+
+def test_side_effect_dependencies_keep_their_order(tmp_path):
+    @tool
+    def create_directory(path: str) -> str:
+        """Create a directory."""
+        time.sleep(0.05)
+        os.mkdir(path)
+        return path
+
+    @tool
+    def write_file(path: str, content: str) -> int:
+        """Write a file."""
+        with open(path, "w") as f:
+            return f.write(content)
+
+    code = f'd = "{tmp_path}/out"\ncreate_directory(d)\nwrite_file(d + "/a.txt", "hi")'
+    results = execute_python_code(code, [create_directory, write_file])
+    assert not results.errors
+    assert (tmp_path / "out" / "a.txt").read_text() == "hi"
+
+
+def test_error_in_group_propagates_after_all_calls_ran():
+    ran = []
+
+    @tool(parallel_safe=True)
+    def fails(x: int) -> int:
+        """Always fails."""
+        raise ValueError("boom")
+
+    @tool(parallel_safe=True)
+    def works(x: int) -> int:
+        """Records its call."""
+        ran.append(x)
+        return x
+
+    results = execute_python_code(
+        "a = works(1)\nb = fails(2)\nc = works(3)", [fails, works]
+    )
+    assert "boom" in results.errors[-1]
+    assert results.data["a"] == 1
+    assert "b" not in results.data and "c" not in results.data
+    assert sorted(ran) == [1, 3]
+
+
+def test_async_parallel_safe_coroutines_are_gathered():
+    running = []
+    peak = []
+
+    async def lookup(x: int) -> int:
+        running.append(x)
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(x)
+        return x
+
+    lookup.parallel_safe = True
+    results = asyncio.run(
+        async_execute_python_code("a = lookup(1)\nb = lookup(2)", [lookup])
+    )
+    assert not results.errors
+    assert (results.data["a"], results.data["b"]) == (1, 2)
+    assert max(peak) == 2
+
+
+def test_parallel_can_be_disabled():
+    threads = set()
+
+    @tool(parallel_safe=True)
+    def where(x: int) -> int:
+        """Record the calling thread."""
+        threads.add(threading.get_ident())
+        return x
+
+    execute_python_code("a = where(1)\nb = where(2)", [where], parallel=False)
+    assert threads == {threading.get_ident()}
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from dria_agent.pythonic.engine import ToolTimeoutError, call_with_timeout
+from dria_agent.pythonic.sandbox import ProcessSandbox
+
+
+@pytest.fixture(scope="module")
+def sandbox():
+    with ProcessSandbox(workers=1, timeout=5) as sandbox:
+        yield sandbox
+
+
+def test_tools_are_called_in_the_parent(sandbox):
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    results = sandbox.execute("x = add(1, 2)", [add])
+    assert not results.errors
+    assert results.data["x"] == 3
+
+
+def test_runaway_code_times_out_and_the_worker_is_replaced(sandbox):
+    results = sandbox.execute("while True: pass", timeout=0.3)
+    assert results.errors == ["Execution timed out after 0.3s"]
+    assert sandbox.execute("x = 1").data["x"] == 1
+
+
+def test_tool_with_no_time_left_is_not_started(sandbox):
+    started = []
+
+    def slow() -> int:
+        started.append(1)
+        return 1
+
+    slow.timeout = 0
+    results = sandbox.execute("x = slow()", [slow])
+    assert "No time left to call slow" in results.errors[-1]
+    assert started == []
+
+
+def test_call_with_timeout_rejects_non_positive_timeouts():
+    started = []
+    with pytest.raises(ToolTimeoutError):
+        call_with_timeout("tool", lambda: started.append(1), (), {}, 0)
+    assert started == []
+
+
+def test_close_during_execution_reports_an_error():
+    sandbox = ProcessSandbox(workers=1, timeout=5)
+    threading.Timer(0.3, sandbox.close).start()
+    start = time.monotonic()
+    results = sandbox.execute("while True: pass")
+    assert time.monotonic() - start < 5
+    assert results.errors == ["ProcessSandbox was closed during execution"]
+    with pytest.raises(RuntimeError):
+        sandbox.execute("x = 1")
@@ -0,0 +1,46 @@
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from dria_agent.agent import service
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.service import EmbeddingServer, ServiceEmbedding
+
+
+class ConstantEmbedding(BaseEmbedding):
+    def __init__(self):
+        super().__init__("constant", 4)
+
+    def batch_embed(self, texts):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+    def _embed_query(self, text):
+        return np.ones(4, dtype=np.float32)
+
+
+def test_socket_is_private_to_the_user(tmp_path, monkeypatch):
+    user_dir = str(tmp_path / "run")
+    monkeypatch.setattr(service, "_USER_DIR", user_dir)
+    path = os.path.join(user_dir, "embedding.sock")
+    server = EmbeddingServer(ConstantEmbedding(), path).start()
+    try:
+        assert stat.S_IMODE(os.stat(user_dir).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        client = ServiceEmbedding(path=path)
+        assert client.model_name == "constant"
+        assert client.cache_key == "constant"
+        assert client.batch_embed(["a", "b"]).shape == (2, 4)
+    finally:
+        server.close()
+    assert not os.path.exists(path)
+
+
+def test_shared_socket_directory_is_refused(tmp_path, monkeypatch):
+    user_dir = tmp_path / "shared"
+    user_dir.mkdir(mode=0o777)
+    os.chmod(user_dir, 0o777)
+    monkeypatch.setattr(service, "_USER_DIR", str(user_dir))
+    with pytest.raises(RuntimeError):
+        EmbeddingServer(ConstantEmbedding(), str(user_dir / "embedding.sock"))
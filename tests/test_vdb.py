@@ -0,0 +1,178 @@
+import threading
+import zlib
+
+import numpy as np
+import pytest
+
+from dria_agent.agent.embedder import BaseEmbedding
+from dria_agent.agent.vdb import IVFIndex, ToolDB
+
+DIM = 32
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic embedding: every text gets its own random direction."""
+
+    def __init__(self):
+        super().__init__("hash", DIM)
+
+    def _vector(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return rng.standard_normal(DIM).astype(np.float32)
+
+    def batch_embed(self, texts):
+        return np.stack([self._vector(t) for t in texts])
+
+    def _embed_query(self, text):
+        return self._vector(text)
+
+
+def make_db(n=10, **options):
+    db = ToolDB(HashEmbedding(), **options)
+    db.add([f"tool_{i}" for i in range(n)])
+    return db
+
+
+def test_nearest_finds_the_matching_text():
+    db = make_db()
+    assert db.nearest("tool_3") == ["tool_3"]
+    ids, scores = db.nearest("tool_3", k=3, return_scores=True)
+    assert len(ids) == 3 and scores[0] == pytest.approx(1.0, abs=1e-2)
+
+
+def test_unchanged_entries_are_not_re_embedded():
+    db = make_db()
+    db.add(["tool_1", "tool_2"])
+    assert db.count == 10
+    db.add(["new text"], ids=["tool_1"])
+    assert db.count == 11 and db.deleted == 1
+    assert db.nearest("new text") == ["tool_1"]
+
+
+def test_remove_tombstones_rows():
+    db = make_db()
+    db.COMPACT_RATIO = 1.0  # keep tombstones around
+    db.remove(["tool_3", "unknown"])
+    assert "tool_3" not in db and len(db) == 9
+    assert db.count == 10 and db.deleted == 1
+    assert "tool_3" not in db.nearest("tool_3", k=10)
+    assert len(db.nearest("tool_3", k=20)) == 9
+
+
+def test_compact_drops_tombstones_and_keeps_results():
+    db = make_db()
+    db.COMPACT_RATIO = 1.0
+    db.remove([f"tool_{i}" for i in range(0, 10, 2)])
+    before = {f"tool_{i}": db.nearest(f"tool_{i}") for i in range(1, 10, 2)}
+    db.compact()
+    assert db.count == 5 and db.deleted == 0
+    assert db.snapshot.alive is None
+    assert {id: db.nearest(id) for id in before} == before
+    assert db.snapshot.rows == {id: row for row, id in enumerate(db.snapshot.ids)}
+
+
+def test_automatic_compaction():
+    db = make_db(8)
+    db.remove(["tool_0", "tool_1", "tool_2"])
+    db._compactor.join()
+    assert db.deleted == 0 and db.count == 5
+    assert db.nearest("tool_5") == ["tool_5"]
+
+
+class Tool:
+    def __init__(self, name, doc="tool"):
+        self.name = name
+        self.doc = doc
+
+    def __str__(self):
+        return f"def {self.name}(): {self.doc}"
+
+
+def test_sync_makes_the_index_match_the_tool_set():
+    db = ToolDB(HashEmbedding())
+    db.upsert([Tool("a"), Tool("b"), Tool("c")])
+    db.sync([Tool("b"), Tool("c", "changed"), Tool("d")])
+    assert sorted(db.snapshot.items) == ["b", "c", "d"]
+    assert db.get("c").doc == "changed"
+    assert db.nearest("def c(): changed") == ["c"]
+
+
+def test_sync_in_background_publishes_once():
+    db = ToolDB(HashEmbedding())
+    db.upsert([Tool("a")])
+    before = db.snapshot
+    db.sync([Tool("b"), Tool("c")], background=True).join()
+    assert sorted(before.items) == ["a"]
+    assert sorted(db.snapshot.items) == ["b", "c"]
+
+
+def test_snapshots_are_unaffected_by_later_writes():
+    db = make_db()
+    snapshot = db.snapshot
+    db.remove(["tool_3"])
+    db.add(["tool_99"])
+    db.compact()
+    assert "tool_3" in snapshot.items and "tool_99" not in snapshot.items
+    assert db.nearest("tool_3", snapshot=snapshot) == ["tool_3"]
+    assert db.nearest("tool_99", k=11, snapshot=snapshot).count("tool_99") == 0
+    assert db.nearest("tool_99") == ["tool_99"]
+
+
+def test_readers_during_writes_see_consistent_snapshots():
+    db = make_db(50)
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            try:
+                snapshot = db.snapshot
+                for id in db.nearest("tool_7", k=5, snapshot=snapshot):
+                    assert id in snapshot.items
+            except Exception as e:
+                errors.append(e)
+                return
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for round in range(30):
+        db.add([f"extra_{round}_{i}" for i in range(5)])
+        db.remove([f"extra_{round}_{i}" for i in range(4)])
+        if round % 10 == 0:
+            db.compact()
+    stop.set()
+    for reader in readers:
+        reader.join()
+    assert errors == []
+    assert len(db) == 50 + 30
+
+
+def test_set_nprobe_republishes_the_index():
+    db = make_db(200, index=IVFIndex(nlist=8, nprobe=2))
+    assert db.snapshot.index.nprobe == 2
+    db.set_nprobe(8)
+    assert db.snapshot.index.nprobe == 8
+    assert db.nearest("tool_42") == ["tool_42"]
+    with pytest.raises(ValueError):
+        db.set_nprobe(0)
+    with pytest.raises(ValueError):
+        make_db().set_nprobe(4)
+
+
+def test_persistent_cache_is_keyed_by_the_embedding_backend(tmp_path):
+    embedding = HashEmbedding()
+    db = ToolDB(embedding, cache_dir=str(tmp_path))
+    db.add(["tool_1"])
+    assert len(db.cache) == 1
+
+    embedding = HashEmbedding()
+    embedding.cache_key = "hash-onnx-int8"
+    assert len(ToolDB(embedding, cache_dir=str(tmp_path)).cache) == 0
+
+
+def test_embeddings_must_match_the_texts():
+    embedding = HashEmbedding()
+    embedding.batch_embed = lambda texts: np.zeros((len(texts) + 1, DIM))
+    with pytest.raises(ValueError, match="returned 3 embeddings for 2 texts"):
+        ToolDB(embedding).add(["a", "b"])